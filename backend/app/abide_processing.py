@@ -1,7 +1,11 @@
+import os
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
 import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy import stats
 
 from app.rsn_constants import (
@@ -14,22 +18,54 @@ from app.rsn_constants import (
 )
 from app.wavelet_processing import compute_wavelet_matrices
 
+# Working-set budget for one block of windows in windowed_correlation:
+# about half a typical per-core L2
+_FRAME_BLOCK_BYTES = 512 * 1024
+
+# 0-based DR file columns of the RSNs, in display order
+_RSN_COLUMNS = np.array(RSN_INDICES, dtype=np.intp) - 1
+
 
 def parse_dr_file(filepath: Path) -> np.ndarray:
-    data = np.loadtxt(filepath)
-    if data.ndim == 1:
-        data = data.reshape(1, -1)
+    # Keyed on mtime as well, so a rewritten file is parsed again
+    return _parse_dr_file(filepath, filepath.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _parse_dr_file(filepath: Path, mtime_ns: int) -> np.ndarray:
+    # Parsing the text dominates a request, and the same subject is usually
+    # requested repeatedly with different window/smoothing settings. Shared
+    # between callers, so it's read-only.
+    # pandas' C tokenizer reads the whitespace-separated floats far faster
+    # than np.loadtxt; a single row still comes back 2-D
+    try:
+        data = pd.read_csv(
+            filepath,
+            sep=r"\s+",
+            header=None,
+            comment="#",
+            dtype=np.float64,
+            engine="c",
+        ).to_numpy()
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+        raise ValueError(f"Could not parse DR file {filepath.name}: {e}") from e
+    data.setflags(write=False)
     return data
 
 
 def filter_rsn_columns(data: np.ndarray) -> np.ndarray:
-    indices = [i - 1 for i in RSN_INDICES]
-    return data[:, indices]
+    return np.take(data, _RSN_COLUMNS, axis=1)
 
 
 def get_rsn_labels(short: bool = True) -> List[str]:
+    # A copy, so callers can't mutate the cached labels
+    return list(_rsn_labels(short))
+
+
+@lru_cache(maxsize=None)
+def _rsn_labels(short: bool) -> tuple[str, ...]:
     names = RSN_SHORT if short else RSN_NAMES
-    return [names[i] for i in RSN_INDICES]
+    return tuple(names[i] for i in RSN_INDICES)
 
 
 def parse_phenotypics(filepath: Path | None = None) -> dict[int, str]:
@@ -52,7 +88,38 @@ def parse_phenotypics(filepath: Path | None = None) -> dict[int, str]:
 
 
 def list_subject_files(data_dir: Path) -> List[dict]:
-    phenotypics = parse_phenotypics()
+    # Keyed on mtimes as well, so added subjects or edited phenotypics are
+    # picked up. Copies, so callers can't mutate the cached listing
+    phenotypics_path = PHENOTYPICS_FILE_PATH
+    phenotypics_mtime_ns = (
+        phenotypics_path.stat().st_mtime_ns if phenotypics_path.exists() else None
+    )
+    listing = _list_subject_files(
+        data_dir, _tree_mtime_ns(data_dir), phenotypics_path, phenotypics_mtime_ns
+    )
+    return [dict(f) for f in listing]
+
+
+def _tree_mtime_ns(root: Path) -> int:
+    # Subject files sit in nested version/site directories, and adding or
+    # removing one only touches its own directory's mtime, not the root's.
+    # os.walk lists entries without a stat per file
+    return max(
+        (os.stat(dirpath).st_mtime_ns for dirpath, _, _ in os.walk(root)),
+        default=0,
+    )
+
+
+@lru_cache(maxsize=4)
+def _list_subject_files(
+    data_dir: Path,
+    tree_mtime_ns: int,
+    phenotypics_path: Path,
+    phenotypics_mtime_ns: int | None,
+) -> tuple[dict, ...]:
+    # Walking the tree and parsing phenotypics is the same work every call
+    # while the data is static, so it's done once per (data_dir, phenotypics)
+    phenotypics = parse_phenotypics(phenotypics_path)
 
     files = []
 
@@ -76,21 +143,48 @@ def list_subject_files(data_dir: Path) -> List[dict]:
             }
         )
 
-    return sorted(files, key=lambda x: (x["version"], x["site"], x["subject_id"]))
+    return tuple(
+        sorted(files, key=lambda x: (x["version"], x["site"], x["subject_id"]))
+    )
+
+
+def _correlate_rows(series: np.ndarray) -> np.ndarray:
+    """Pearson correlation between the rows of series, batched over leading axes."""
+    # Each series is centered and normalized once, so every pair is a plain
+    # dot product and the whole matrix one matmul. Constant series divide by
+    # zero and give NaN, as np.corrcoef does
+    centered = series - series.mean(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = centered / np.linalg.norm(centered, axis=-1, keepdims=True)
+    matrix = normalized @ np.swapaxes(normalized, -1, -2)
+    return np.clip(matrix, -1.0, 1.0, out=matrix)
+
+
+def _rank_rows(series: np.ndarray) -> np.ndarray:
+    """Ranks along the last axis, averaged over ties like scipy's rankdata."""
+    # One argsort and a scatter give the ranks of every row at once; real
+    # BOLD series practically never tie, so rankdata's tie handling is only
+    # paid for when a sorted row repeats a value (or holds NaNs, sorted last)
+    order = np.argsort(series, axis=-1)
+    ordered = np.take_along_axis(series, order, axis=-1)
+    if (ordered[..., 1:] == ordered[..., :-1]).any() or np.isnan(ordered[..., -1]).any():
+        return stats.rankdata(series, axis=-1)
+
+    ranks = np.empty(series.shape)
+    positions = np.arange(1.0, series.shape[-1] + 1)
+    np.put_along_axis(ranks, order, np.broadcast_to(positions, series.shape), axis=-1)
+    return ranks
 
 
 def pearson_matrix(data: np.ndarray) -> np.ndarray:
-    return np.corrcoef(data.T)
+    return _correlate_rows(data.T)
 
 
 def spearman_matrix(data: np.ndarray) -> np.ndarray:
-    n = data.shape[1]
-    matrix = np.zeros((n, n))
-    for i in range(n):
-        for j in range(i, n):
-            r, _ = stats.spearmanr(data[:, i], data[:, j])
-            matrix[i, j] = matrix[j, i] = r if not np.isnan(r) else 0.0
-    return matrix
+    # Spearman is Pearson on ranks; undefined correlations (constant
+    # columns) are reported as 0
+    matrix = _correlate_rows(_rank_rows(data.T))
+    return np.nan_to_num(matrix, copy=False, nan=0.0)
 
 
 def compute_correlation(data: np.ndarray, method: CorrelationMethod) -> np.ndarray:
@@ -102,6 +196,33 @@ def compute_correlation(data: np.ndarray, method: CorrelationMethod) -> np.ndarr
         raise ValueError(f"Unknown method: {method}")
 
 
+def _rolling_pearson(data: np.ndarray, window_size: int, starts: np.ndarray) -> np.ndarray:
+    """Pearson matrix of every window from prefix sums, without revisiting overlaps."""
+    # Centered on the global mean first, so the prefix sums stay small and
+    # the variance differences don't cancel catastrophically
+    x = data - data.mean(axis=0)
+    ends = starts + window_size
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        prefix = np.zeros((len(values) + 1, *values.shape[1:]))
+        np.cumsum(values, axis=0, out=prefix[1:])
+        return prefix[ends] - prefix[starts]
+
+    sums = window_sums(x)
+    products = window_sums(x[:, :, np.newaxis] * x[:, np.newaxis, :])
+    squares = np.diagonal(products, axis1=1, axis2=2)
+
+    # Per-window scatter matrices: sum of (x_i - mean_i)(x_j - mean_j)
+    scatter = products - sums[:, :, np.newaxis] * sums[:, np.newaxis, :] / window_size
+    variances = np.diagonal(scatter, axis1=1, axis2=2).copy()
+    # A series constant within a window has zero variance, but the prefix
+    # differences leave rounding noise; mark it undefined so its
+    # correlations are NaN, as np.corrcoef gives
+    variances[variances <= 1e-10 * squares] = np.nan
+    matrices = scatter / np.sqrt(variances[:, :, np.newaxis] * variances[:, np.newaxis, :])
+    return np.clip(matrices, -1.0, 1.0, out=matrices)
+
+
 def windowed_correlation(
     data: np.ndarray,
     method: CorrelationMethod,
@@ -116,14 +237,33 @@ def windowed_correlation(
             f"Window size {window_size} too large for {n_timepoints} timepoints"
         )
 
-    n_nodes = data.shape[1]
-    matrices = np.zeros((n_frames, n_nodes, n_nodes))
-
-    for f in range(n_frames):
-        start = f * step
-        end = start + window_size
-        matrices[f] = compute_correlation(data[start:end], method)
+    if method not in (CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN):
+        raise ValueError(f"Unknown method: {method}")
 
+    # float32 halves memory traffic through smoothing/interpolation and the
+    # min/max scans; weights stay far above float32 resolution
+    if method == CorrelationMethod.PEARSON and step < window_size:
+        # Overlapping windows: prefix sums cost O(T) instead of O(frames * W)
+        starts = np.arange(n_frames) * step
+        return _rolling_pearson(data, window_size, starts).astype(np.float32)
+
+    # (frames, nodes, window) view of every window, without copying the data.
+    # Frames are correlated in blocks so the ranked/normalized copies of a
+    # block stay cache-sized however long the series is
+    windows = sliding_window_view(data, window_size, axis=0)[::step]
+    n_nodes = data.shape[1]
+    block = max(1, _FRAME_BLOCK_BYTES // (n_nodes * window_size * 8))
+
+    matrices = np.empty((n_frames, n_nodes, n_nodes), dtype=np.float32)
+    for start in range(0, n_frames, block):
+        block_windows = windows[start : start + block]
+        if method == CorrelationMethod.SPEARMAN:
+            block_windows = _rank_rows(block_windows)
+        matrices[start : start + block] = _correlate_rows(block_windows)
+
+    if method == CorrelationMethod.SPEARMAN:
+        # Same convention as spearman_matrix: undefined correlations are 0
+        np.nan_to_num(matrices, copy=False, nan=0.0)
     return matrices
 
 
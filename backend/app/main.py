@@ -3,10 +3,11 @@ from pathlib import Path
 import numpy as np
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from scipy.ndimage import gaussian_filter1d
 from scipy.interpolate import interp1d, UnivariateSpline, make_interp_spline
 
-from app.models import Edge, GraphFrame, GraphMeta, Node
+from app.models import GraphMeta, Node
 from app.abide_processing import (
     CorrelationMethod,
     CorrelationParams,
@@ -26,6 +27,10 @@ from app.processing import (
 # Data directory (relative to project root)
 DATA_DIR = Path(__file__).parent.parent.parent / "data" / "ABIDE"
 
+# Node labels are fixed by the RSN set (short for IDs, long for display)
+NODE_IDS = tuple(get_rsn_labels(short=True))
+NODE_FULL_NAMES = tuple(get_rsn_labels(short=False))
+
 app = FastAPI(title="BrainViz Graph Backend", version="0.1.0")
 app.add_middleware(
     CORSMiddleware,
@@ -48,7 +53,13 @@ def list_abide_files() -> dict:
 
 
 @app.post("/abide/data")
-def get_abide_data(request: CorrelationRequest) -> dict:
+def get_abide_data(request: CorrelationRequest) -> JSONResponse:
+    # Reject a bad method before touching the filesystem
+    try:
+        corr_method = CorrelationMethod(request.method)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid method: {request.method}")
+
     # Validate file path
     full_path = DATA_DIR / request.file_path
     if not full_path.exists():
@@ -56,11 +67,6 @@ def get_abide_data(request: CorrelationRequest) -> dict:
             status_code=404, detail=f"File not found: {request.file_path}"
         )
 
-    try:
-        corr_method = CorrelationMethod(request.method)
-    except ValueError:
-        raise HTTPException(status_code=400, detail=f"Invalid method: {request.method}")
-
     params = CorrelationParams(
         method=corr_method,
         window_size=request.window_size,
@@ -83,88 +89,107 @@ def get_abide_data(request: CorrelationRequest) -> dict:
     if request.smoothing is not None and request.smoothing.algorithm is not None:
         matrices = apply_smoothing(matrices, request.smoothing)
 
-    # Get node labels (short for IDs, long for display)
-    node_labels = get_rsn_labels(short=True)
-    node_long_labels = get_rsn_labels(short=False)
+    try:
+        graph_data = build_graph_data(
+            matrices,
+            symmetric=is_symmetric(corr_method),
+            file_path=request.file_path,
+            method=request.method,
+            window_size=request.window_size,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    # The body is already plain JSON types, so hand it straight to the
+    # encoder: the default response path would validate it as a dict and walk
+    # every frame through jsonable_encoder first
+    return JSONResponse(graph_data)
+
+
+def build_graph_data(
+    matrices: list[np.ndarray],
+    symmetric: bool,
+    file_path: str,
+    method: str,
+    window_size: int | None = None,
+) -> dict:
+    """The /abide/data response body for already computed matrices."""
+    # The graph is dense and its topology is the same in every frame, so
+    # derive edge endpoints and node degrees once instead of per frame
+    n = len(NODE_IDS)
     # For symmetric correlations, only create upper triangle edges
     # to avoid duplicate A→B and B→A edges with same weight
-    symmetric = is_symmetric(corr_method)
+    edge_pairs = [
+        (i, j)
+        for i in range(n)
+        for j in range(i + 1 if symmetric else 0, n)
+        if i != j
+    ]
+    edge_rows, edge_cols = np.array(edge_pairs, dtype=np.intp).reshape(-1, 2).T
+
+    degree_map: dict[str, int] = {nid: 0 for nid in NODE_IDS}
+    for i, j in edge_pairs:
+        # For symmetric edges, both nodes get degree incremented
+        degree_map[NODE_IDS[i]] += 1
+        if symmetric:
+            degree_map[NODE_IDS[j]] += 1
+
+    nodes = [
+        Node(
+            id=node_id,
+            label=node_id,
+            full_name=NODE_FULL_NAMES[i],
+            degree=degree_map[node_id],
+        ).model_dump()
+        for i, node_id in enumerate(NODE_IDS)
+    ]
+    metadata = {
+        "source": "abide",
+        "file": file_path,
+        "method": method,
+        "window_size": "full" if window_size is None else str(window_size),
+    }
 
-    # Build frames
+    # Frames are built directly as dicts in the GraphFrame/Edge shape: one
+    # model per edge, validated and then dumped again, dominated long requests
     processed_frames = []
     for timestamp, matrix in enumerate(matrices):
-        n = matrix.shape[0]
-        node_ids = node_labels
-
-        edges = []
-        degree_map: dict[str, int] = {nid: 0 for nid in node_ids}
-
-        for i in range(n):
-            j_start = i + 1 if symmetric else 0
-            for j in range(j_start, n):
-                if i == j:
-                    continue
-                weight = float(matrix[i, j])
-                edges.append(
-                    Edge(
-                        source=node_ids[i],
-                        target=node_ids[j],
-                        weight=weight,
-                    )
-                )
-                # For symmetric edges, both nodes get degree incremented
-                degree_map[node_ids[i]] += 1
-                if symmetric:
-                    degree_map[node_ids[j]] += 1
-
-        nodes = [
-            Node(
-                id=node_id,
-                label=node_id,
-                full_name=node_long_labels[i],
-                degree=degree_map[node_id],
-            )
-            for i, node_id in enumerate(node_ids)
+        weights = matrix[edge_rows, edge_cols].tolist()
+        edges = [
+            {
+                "source": NODE_IDS[i],
+                "target": NODE_IDS[j],
+                "weight": weight,
+                "directed": False,
+                "attrs": {},
+            }
+            for (i, j), weight in zip(edge_pairs, weights)
         ]
-
         processed_frames.append(
-            GraphFrame(
-                timestamp=timestamp,
-                nodes=nodes,
-                edges=edges,
-                metadata={
-                    "source": "abide",
-                    "file": request.file_path,
-                    "method": request.method,
-                    "window_size": (
-                        "full"
-                        if request.window_size is None
-                        else str(request.window_size)
-                    ),
-                },
-            )
+            {
+                "timestamp": timestamp,
+                "nodes": nodes,
+                "edges": edges,
+                "metadata": metadata,
+            }
         )
 
     # Calculate edge weight range from actual data
     # Values are raw correlation coefficients (typically [-1, 1] for Pearson/Spearman)
     # Frontend must use these values to scale visualizations - never assume a fixed range
-    all_weights = []
-    for matrix in matrices:
-        mask = ~np.eye(matrix.shape[0], dtype=bool)
-        if symmetric:
-            mask = np.triu(mask, k=1)
-        all_weights.extend(matrix[mask].tolist())
-
-    if not all_weights:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid data file: no correlation matrices could be computed. "
-            "The file may be empty, corrupted, or have insufficient data points.",
+    if matrices:
+        all_weights = np.stack(matrices)[:, edge_rows, edge_cols]
+    else:
+        all_weights = np.empty(0)
+
+    if all_weights.size == 0:
+        raise ValueError(
+            "Invalid data file: no correlation matrices could be computed. "
+            "The file may be empty, corrupted, or have insufficient data points."
         )
 
-    edge_weight_min = float(min(all_weights))
-    edge_weight_max = float(max(all_weights))
+    edge_weight_min = float(all_weights.min())
+    edge_weight_max = float(all_weights.max())
 
     meta = GraphMeta(
         frame_count=len(matrices),
@@ -172,11 +197,11 @@ def get_abide_data(request: CorrelationRequest) -> dict:
         edge_attributes=["weight"],
         edge_weight_min=edge_weight_min,
         edge_weight_max=edge_weight_max,
-        description=f"ABIDE data: {request.file_path} ({request.method} correlation)",
+        description=f"ABIDE data: {file_path} ({method} correlation)",
     )
 
     return {
-        "frames": [frame.model_dump() for frame in processed_frames],
+        "frames": processed_frames,
         "meta": meta.model_dump(),
         "symmetric": symmetric,
     }
@@ -190,6 +215,7 @@ def apply_smoothing(
 
     num_frames = len(matrices)
     n = matrices[0].shape[0]
+    dtype = matrices[0].dtype
 
     smoothed_data: dict[tuple[int, int], np.ndarray] = {}
 
@@ -221,7 +247,7 @@ def apply_smoothing(
 
     result = []
     for t in range(num_frames):
-        matrix = np.zeros((n, n))
+        matrix = np.zeros((n, n), dtype=dtype)
         for i in range(n):
             for j in range(n):
                 matrix[i, j] = smoothed_data[(i, j)][t]
@@ -238,6 +264,7 @@ def apply_interpolation(
 
     num_frames = len(matrices)
     n = matrices[0].shape[0]
+    dtype = matrices[0].dtype
 
     original_times = np.arange(num_frames)
     new_num_frames = (num_frames - 1) * params.factor + 1
@@ -276,7 +303,7 @@ def apply_interpolation(
 
     result = []
     for t in range(new_num_frames):
-        matrix = np.zeros((n, n))
+        matrix = np.zeros((n, n), dtype=dtype)
         for i in range(n):
             for j in range(n):
                 matrix[i, j] = interpolated_data[(i, j)][t]
@@ -1,5 +1,6 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Any, List
 
 import h5py
 import numpy as np
@@ -22,6 +23,71 @@ def allowed_scales(periods: np.array, lower_period: float, upper_period: float):
     return np.where(mask)[0]
 
 
+@lru_cache(maxsize=1)
+def _open_wavelet_file(h5_path: Path) -> h5py.File:
+    # Kept open for the life of the process: the file is read-only at runtime
+    # and reopening it per request re-parses the superblock and group tree.
+    # The chunk cache is per dataset and every pair dataset stays open, so it
+    # keeps HDF5's 1 MiB default: a repeat request for a subject only needs
+    # one chunk per pair, and a larger cache would be multiplied by 182
+    return h5py.File(str(h5_path), "r")
+
+
+def _dataset(group: h5py.File | h5py.Group, key: str) -> h5py.Dataset:
+    item = group[key]
+    assert isinstance(item, h5py.Dataset), f"Expected Dataset at '{key}'"
+    return item
+
+
+def _group(group: h5py.File | h5py.Group, key: str) -> h5py.Group:
+    item = group[key]
+    assert isinstance(item, h5py.Group), f"Expected Group at '{key}'"
+    return item
+
+
+@lru_cache(maxsize=1)
+def _subject_index(h5_path: Path) -> dict[int, int]:
+    subjects = np.asarray(_dataset(_open_wavelet_file(h5_path), "wavelet_subjects"))
+    return {int(sid): idx for idx, sid in enumerate(subjects)}
+
+
+@lru_cache(maxsize=1)
+def _period_per_subject(h5_path: Path) -> np.ndarray:
+    return np.asarray(_dataset(_open_wavelet_file(h5_path), "period_per_subject"))
+
+
+def _angle_maps_source(h5_path: Path, ds: h5py.Dataset) -> h5py.Dataset | np.memmap:
+    # Contiguous datasets (no chunking, hence no compression) are a plain byte
+    # range in the file, so memory-map them and skip libhdf5's per-read copy
+    # get_offset is missing from the h5py stubs' DatasetID
+    dataset_id: Any = ds.id
+    offset = dataset_id.get_offset()
+    if ds.chunks is None and offset is not None:
+        return np.memmap(h5_path, dtype=ds.dtype, mode="r", offset=offset, shape=ds.shape)
+    return ds
+
+
+@lru_cache(maxsize=1)
+def _pair_datasets(
+    h5_path: Path,
+) -> list[tuple[int, int, h5py.Dataset | np.memmap]]:
+    """(row, col, angle_maps) per RSN pair, with names resolved to positions once."""
+    pairs_group = _group(_open_wavelet_file(h5_path), "pairs")
+    pair_datasets = []
+    for pair_key in pairs_group.keys():
+        rsn1, rsn2 = pair_key.split("_")
+        i = RSN_NAME_TO_POSITION.get(rsn1)
+        j = RSN_NAME_TO_POSITION.get(rsn2)
+        if i is None:
+            raise ValueError(f"invalid RSN name {rsn1}")
+        if j is None:
+            raise ValueError(f"invalid RSN name {rsn2}")
+        pair_group = _group(pairs_group, pair_key)
+        angle_maps = _angle_maps_source(h5_path, _dataset(pair_group, "angle_maps"))
+        pair_datasets.append((i, j, angle_maps))
+    return pair_datasets
+
+
 def compute_wavelet_matrices(
     filepath: Path, params: CorrelationParams
 ) -> List[np.ndarray]:
@@ -30,65 +96,57 @@ def compute_wavelet_matrices(
     if not WAVELET_HDF5_PATH.exists():
         raise FileNotFoundError(f"Wavelet data not found: {WAVELET_HDF5_PATH}")
 
-    with h5py.File(WAVELET_HDF5_PATH, "r") as f:
-        subjects = f["wavelet_subjects"][:]
-        matches = np.where(subjects == subject_id)[0]
-        if len(matches) == 0:
-            raise ValueError(f"Subject {subject_id} not found in wavelet data")
-        subj_idx = int(matches[0])
-        period_mapping = f["period_per_subject"][:, subj_idx]
-        filter_scales = allowed_scales(
-            period_mapping, lower_period=10.0, upper_period=100.0
-        )
+    subj_idx = _subject_index(WAVELET_HDF5_PATH).get(subject_id)
+    if subj_idx is None:
+        raise ValueError(f"Subject {subject_id} not found in wavelet data")
+
+    pair_datasets = _pair_datasets(WAVELET_HDF5_PATH)
 
-        pairs = list(f["pairs"].keys())
+    period_mapping = _period_per_subject(WAVELET_HDF5_PATH)[:, subj_idx]
+    filter_scales = allowed_scales(
+        period_mapping, lower_period=10.0, upper_period=100.0
+    )
 
-        first_pair = f["pairs"][pairs[0]]["angle_maps"]
-        n_timepoints = first_pair.shape[1]
+    first_pair = pair_datasets[0][2]
+    n_timepoints = first_pair.shape[1]
 
-        window_size = (
-            params.window_size if params.window_size is not None else n_timepoints
+    window_size = (
+        params.window_size if params.window_size is not None else n_timepoints
+    )
+    step = params.step if params.step is not None else 1
+
+    n_frames = (n_timepoints - window_size) // step + 1
+    if n_frames <= 0:
+        raise ValueError(
+            f"Window size {window_size} too large for {n_timepoints} timepoints"
+        )
+
+    # Initialize with 0 (both directions populated from HDF5)
+    matrices = np.zeros((n_frames, NUM_RSNS, NUM_RSNS), dtype=np.float32)
+    window_starts = np.arange(n_frames) * step
+    n_all = window_size * len(filter_scales)
+
+    # Slabs are read straight into a reused buffer instead of a fresh array per read
+    phase_data = np.empty(first_pair.shape[1:], dtype=first_pair.dtype)
+
+    # Process each pair from HDF5 (both A_B and B_A exist)
+    for i, j, angle_maps in pair_datasets:
+        if isinstance(angle_maps, np.memmap):
+            np.copyto(phase_data, angle_maps[subj_idx])
+        else:
+            angle_maps.read_direct(phase_data, np.s_[subj_idx, :, :])
+        # Leads are counted on the slab as read. The original code also read a
+        # "complementary" slab and masked out PHASE_NONE in both, but it read
+        # the same pair (not {rsn2}_{rsn1}) and masking PHASE_NONE to
+        # PHASE_NONE changes nothing, so that step was a no-op.
+        # Count leads once per timepoint, then every window is a difference
+        # of two prefix sums instead of a fresh scan of the window
+        lead_per_t = np.count_nonzero(
+            phase_data[:, filter_scales] == PHASE_LEAD, axis=1
         )
-        step = params.step if params.step is not None else 1
-
-        n_frames = (n_timepoints - window_size) // step + 1
-        if n_frames <= 0:
-            raise ValueError(
-                f"Window size {window_size} too large for {n_timepoints} timepoints"
-            )
-
-        # Initialize with 0 (both directions populated from HDF5)
-        matrices = [np.zeros((NUM_RSNS, NUM_RSNS)) for _ in range(n_frames)]
-
-        # Process each pair from HDF5 (both A_B and B_A exist)
-        for pair_key in pairs:
-            rsn1, rsn2 = pair_key.split("_")
-            complementary_pair_key = f"{rsn2}_{rsn1}"
-            i = RSN_NAME_TO_POSITION.get(rsn1)
-            j = RSN_NAME_TO_POSITION.get(rsn2)
-            if i is None:
-                raise ValueError(f"invalid RSN name {rsn1}")
-            if j is None:
-                raise ValueError(f"invalid RSN name {rsn2}")
-
-            phase_data = f["pairs"][pair_key]["angle_maps"][subj_idx, :, :]
-            complementary_phase_data = f["pairs"][pair_key]["angle_maps"][
-                subj_idx, :, :
-            ]
-            binary_mask = (phase_data != PHASE_NONE) & (
-                complementary_phase_data != PHASE_NONE
-            )
-            filtered_phase_data = np.where(binary_mask, phase_data, PHASE_NONE)
-
-            for frame_idx in range(n_frames):
-                start = frame_idx * step
-                end = start + window_size
-                window = filtered_phase_data[start:end, filter_scales]
-
-                n_lead = np.count_nonzero(window == PHASE_LEAD)
-                n_all = window.size
-                ratio = n_lead / n_all if n_all > 0 else 0
-
-                matrices[frame_idx][i, j] = ratio
-
-    return matrices
+        lead_cumsum = np.concatenate(([0], np.cumsum(lead_per_t)))
+        n_lead = lead_cumsum[window_starts + window_size] - lead_cumsum[window_starts]
+
+        matrices[:, i, j] = n_lead / n_all if n_all > 0 else 0
+
+    return list(matrices)
@@ -1,11 +1,14 @@
 import argparse
-import csv
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import h5py
 import numpy as np
+import pandas as pd
 from scipy.io.matlab import loadmat
 
 # Phase enum values (from MATLAB)
@@ -44,9 +47,31 @@ def _h5_shape(group: h5py.File | h5py.Group, key: str) -> tuple[int, ...]:
     return shape
 
 
-def _mat_h5_deref(f: h5py.File, ref: Any) -> np.ndarray:
-    refs = _h5_group(f, "#refs#")
-    return np.asarray(refs[ref])
+def _mat_h5_deref(f: h5py.File, ref: Any) -> h5py.Dataset:
+    item = _h5_group(f, "#refs#")[ref]
+    if not isinstance(item, h5py.Dataset):
+        raise TypeError(f"Expected Dataset behind reference, got {type(item).__name__}")
+    return item
+
+
+# HDF5 stores compact datasets inside the object header, which caps them at
+# 64 KiB; stay well under it to leave room for the other header messages
+COMPACT_MAX_BYTES = 32 * 1024
+
+# h5py-stubs only cover the high-level API; the low-level modules and
+# helpers used here are reached through this untyped handle
+_h5py_low_level: Any = h5py
+
+
+def _create_small_dataset(
+    group: h5py.File | h5py.Group, key: str, data: np.ndarray
+) -> h5py.Dataset:
+    # Compact layout keeps tiny arrays in the header: one read, no chunk index
+    dcpl = None
+    if data.nbytes <= COMPACT_MAX_BYTES:
+        dcpl = _h5py_low_level.h5p.create(_h5py_low_level.h5p.DATASET_CREATE)
+        dcpl.set_layout(_h5py_low_level.h5d.COMPACT)
+    return group.create_dataset(key, data=data, dcpl=dcpl)
 
 
 def parse_pair_name(filename: str) -> tuple[str, str]:
@@ -72,40 +97,135 @@ def get_pairs(mat_files: list[Path]) -> list[RSNPair]:
     return pairs
 
 
-def get_mat_file_info(mat_path: Path) -> tuple[int, int, int]:
+def get_mat_file_info(mat_path: Path) -> tuple[tuple[int, int, int], np.ndarray]:
+    """(n_subjects, n_timepoints, n_scales) and period_per_sub, from a single open."""
     with h5py.File(str(mat_path), "r") as f:
         if "Rsq_per_sub" not in f:
             raise ValueError(f"No Rsq_per_sub found in {mat_path}")
         shape = _h5_shape(f, "Rsq_per_sub")
-        return shape[0], shape[1], shape[2]
+        period_per_sub = np.asarray(_h5_dataset(f, "period_per_sub"))
+        return (shape[0], shape[1], shape[2]), period_per_sub
 
 
 def get_subject_ids_order(mat_path: Path) -> np.ndarray:
-    p = loadmat(str(mat_path))
-    return np.array([x.item() for x in p["participantStructs"]["partnum"].squeeze()])
+    try:
+        h5_file = h5py.File(str(mat_path), "r")
+    except OSError:
+        h5_file = None
+    if h5_file is not None:
+        # v7.3 .mat: read just participantStructs/partnum instead of the whole file
+        with h5_file as f:
+            partnum = _h5_dataset(_h5_group(f, "participantStructs"), "partnum")
+            if _h5py_low_level.check_dtype(ref=partnum.dtype) is not None:
+                return np.array(
+                    [np.asarray(f[ref]).item() for ref in np.asarray(partnum).ravel()],
+                    dtype=np.int64,
+                )
+            return np.asarray(partnum, dtype=np.int64).ravel()
+
+    # Older .mat formats aren't HDF5; only parse the variable we need
+    p = loadmat(str(mat_path), variable_names=["participantStructs"])
+    partnum = np.atleast_1d(p["participantStructs"]["partnum"].squeeze())
+    if partnum.dtype != object:
+        return np.asarray(partnum, dtype=np.int64).ravel()
+    # Struct fields come back as an object array of 1x1 arrays
+    return np.fromiter(
+        (x.flat[0] for x in partnum.flat), dtype=np.int64, count=partnum.size
+    )
 
 
-def load_angle_maps(mat_path: Path) -> np.ndarray:
-    with h5py.File(str(mat_path), "r") as f:
-        # MATLAB stores references in angle_maps that point to data in #refs#
-        am_dataset = _h5_dataset(f, "angle_maps")
-        ref = am_dataset[0, 0]
-        return _mat_h5_deref(f, ref)
+def _check_phase_range(angle_maps: np.ndarray, mat_path: Path) -> None:
+    if angle_maps.size and (
+        angle_maps.min() < PHASE_ANTI or angle_maps.max() > PHASE_IN_PHASE
+    ):
+        raise ValueError(
+            f"angle_maps in {mat_path} has values outside "
+            f"[{PHASE_ANTI}, {PHASE_IN_PHASE}]"
+        )
 
 
-def load_period_per_sub(mat_path: Path) -> np.ndarray:
+def _open_angle_maps(f: h5py.File) -> h5py.Dataset:
+    # MATLAB stores references in angle_maps that point to data in #refs#
+    return _mat_h5_deref(f, _h5_dataset(f, "angle_maps")[0, 0])
+
+
+def load_angle_maps(mat_path: Path, out: np.ndarray | None = None) -> np.ndarray:
+    """Read angle_maps as int8, into `out` when given so one buffer serves all pairs."""
     with h5py.File(str(mat_path), "r") as f:
-        return np.asarray(_h5_dataset(f, "period_per_sub"))
+        source = _open_angle_maps(f)
+        if out is None:
+            out = np.empty(source.shape, dtype=np.int8)
+        elif out.shape != source.shape:
+            raise ValueError(
+                f"angle_maps shape {source.shape} in {mat_path.name} "
+                f"doesn't match expected {out.shape}"
+            )
+        # MATLAB writes the phase codes as float64; HDF5 converts on read
+        source.read_direct(out)
+
+    _check_phase_range(out, mat_path)
+    return out
+
+
+def copy_angle_maps(mat_path: Path, dest: h5py.Dataset) -> None:
+    """Stream angle_maps into `dest` one subject at a time, holding a single slab."""
+    # MATLAB v7.3 chunks can span many subjects and be several MB; with the
+    # default 1 MiB cache every per-subject read would decompress its chunk again
+    with h5py.File(
+        str(mat_path),
+        "r",
+        rdcc_nbytes=256 * 1024 * 1024,
+        rdcc_nslots=1_000_003,
+        rdcc_w0=0.75,
+    ) as f:
+        source = _open_angle_maps(f)
+        if source.shape != dest.shape:
+            raise ValueError(
+                f"angle_maps shape {source.shape} in {mat_path.name} "
+                f"doesn't match expected {dest.shape}"
+            )
+        slab = np.empty(dest.shape[1:], dtype=np.int8)
+        for subject in range(dest.shape[0]):
+            source.read_direct(slab, np.s_[subject, :, :])
+            _check_phase_range(slab, mat_path)
+            dest.write_direct(slab, dest_sel=np.s_[subject, :, :])
+
+
+def iter_angle_maps(
+    pairs: list[RSNPair], shape: tuple[int, int, int], workers: int
+) -> Iterator[np.ndarray]:
+    """Yield each pair's angle_maps in order, reading up to `workers` files at once."""
+    # Reads run in worker processes (h5py serializes every call behind one
+    # lock, so threads wouldn't overlap); the caller writes serially. A bounded
+    # window of reads stays in flight so workers load the next pairs while
+    # the caller compresses and writes, without holding every array at once.
+    mat_files = iter([p.mat_file for p in pairs])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[np.ndarray]] = deque(
+            executor.submit(load_angle_maps, mat_file)
+            for mat_file in islice(mat_files, workers + 1)
+        )
+        while pending:
+            angle_maps = pending.popleft().result()
+            next_file = next(mat_files, None)
+            if next_file is not None:
+                pending.append(executor.submit(load_angle_maps, next_file))
 
+            if angle_maps.shape != shape:
+                raise ValueError(
+                    f"angle_maps shape {angle_maps.shape} doesn't match "
+                    f"expected {shape}"
+                )
+            yield angle_maps
 
-def get_subject_ids_from_phenotypics(phenotypics_path: Path) -> list[int]:
 
-    subject_ids = []
-    with open(phenotypics_path, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            subject_ids.append(int(row["partnum"]))
-    return subject_ids
+def get_subject_ids_from_phenotypics(phenotypics_path: Path) -> list[int]:
+    partnum = pd.read_csv(
+        phenotypics_path,
+        usecols=lambda column: column == "partnum",
+        dtype={"partnum": np.int64},
+    )
+    return partnum["partnum"].tolist()
 
 
 def convert_all(
@@ -114,6 +234,7 @@ def convert_all(
     participants: Path,
     phenotypics_path: Path,
     dry_run: bool = False,
+    workers: int = 1,
 ) -> None:
 
     print("=" * 60)
@@ -137,7 +258,9 @@ def convert_all(
     print("=" * 60)
     print(f"  Reading: {mat_files[0].name}")
 
-    n_subjects, n_timepoints, n_scales = get_mat_file_info(mat_files[0])
+    (n_subjects, n_timepoints, n_scales), period_per_sub = get_mat_file_info(
+        mat_files[0]
+    )
     print(f"  Subjects: {n_subjects}")
     print(f"  Timepoints: {n_timepoints}")
     print(f"  Scales: {n_scales}")
@@ -207,27 +330,43 @@ def convert_all(
 
     with h5py.File(str(output_path), "w") as output_f:
         print(f"  Writing wavelet_subjects dataset ({len(wavelet_subjects)} IDs)")
-        output_f.create_dataset("wavelet_subjects", data=wavelet_subjects)
-        output_f.create_dataset(
-            "period_per_subject", data=load_period_per_sub(pairs[0].mat_file)
+        _create_small_dataset(
+            output_f, "wavelet_subjects", wavelet_subjects.astype(np.int32)
+        )
+        _create_small_dataset(
+            output_f,
+            "period_per_subject",
+            period_per_sub.astype(np.float64, copy=False),
         )
 
         pairs_g = output_f.create_group("pairs")
         print(f"  Writing {len(pairs)} RSN pair datasets:")
 
+        shape = (n_subjects, n_timepoints, n_scales)
+        parallel_angle_maps = (
+            iter_angle_maps(pairs, shape, workers) if workers > 1 else None
+        )
         for i, p in enumerate(pairs):
             pair_name = f"{p.network_a}_{p.network_b}"
             print(f"    [{i+1:2d}/{len(pairs)}] {pair_name} <- {p.mat_file.name}")
 
-            angle_maps = load_angle_maps(p.mat_file)
-            if angle_maps.shape[0] != len(wavelet_subjects):
-                raise ValueError(
-                    f"angle_maps shape {angle_maps.shape} doesn't match "
-                    f"{len(wavelet_subjects)} subjects for pair {pair_name}"
-                )
-
             g = pairs_g.create_group(pair_name)
-            g.create_dataset("angle_maps", data=angle_maps)
+            # The backend reads one subject's (timepoints, scales) slab per pair,
+            # so chunk per subject: each read is exactly one chunk fetch.
+            # Only 5 distinct phase values: shuffle + gzip shrinks this several-fold
+            dset = g.create_dataset(
+                "angle_maps",
+                shape=shape,
+                dtype=np.int8,
+                chunks=(1, n_timepoints, n_scales),
+                shuffle=True,
+                compression="gzip",
+                compression_opts=4,
+            )
+            if parallel_angle_maps is not None:
+                dset[...] = next(parallel_angle_maps)
+            else:
+                copy_angle_maps(p.mat_file, dset)
 
     # Verify output
     actual_size = output_path.stat().st_size
@@ -292,10 +431,16 @@ def display_wavelet_data_summary(
         print()
 
         # Sample angle_maps statistics from first pair
-        sample_data = np.asarray(first_pair_data[0, :, :])  # first subject
-        unique_vals = np.unique(sample_data)
+        sample_data = np.asarray(first_pair_data[0, :, :]).astype(np.intp)  # first subject
+        if sample_data.min() >= PHASE_ANTI and sample_data.max() <= PHASE_IN_PHASE:
+            # Phase codes span -2..2, so a shifted bincount replaces np.unique's sort
+            counts = np.bincount(sample_data.ravel() - PHASE_ANTI, minlength=5)
+            unique_vals = np.nonzero(counts)[0] + PHASE_ANTI
+            counts = counts[counts > 0]
+        else:
+            unique_vals, counts = np.unique(sample_data, return_counts=True)
         print("Phase values found in data:")
-        for val in sorted(unique_vals):
+        for val, count in zip(unique_vals, counts):
             label = {
                 PHASE_NONE: "NONE",
                 PHASE_LEAD: "LEAD",
@@ -303,7 +448,7 @@ def display_wavelet_data_summary(
                 PHASE_ANTI: "ANTI",
                 PHASE_IN_PHASE: "IN_PHASE",
             }.get(val, "UNKNOWN")
-            print(f"    {val:2d} = {label}")
+            print(f"    {val:2d} = {label} ({count} samples)")
         print()
 
     # Compare with phenotypics if available
@@ -312,11 +457,7 @@ def display_wavelet_data_summary(
 
     print("Phenotypics validation:")
     if phenotypics_path.exists():
-        pheno_subjects = []
-        with open(phenotypics_path, "r") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                pheno_subjects.append(int(row["partnum"]))
+        pheno_subjects = get_subject_ids_from_phenotypics(phenotypics_path)
 
         print(f"  Phenotypics file: {phenotypics_path}")
         print(f"  Phenotypics subjects: {len(pheno_subjects)}")
@@ -368,6 +509,12 @@ def main():
         type=Path,
         help="Path to phenotypics.csv",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes reading .mat files in parallel",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -395,6 +542,7 @@ def main():
         participants=args.participants,
         phenotypics_path=args.phenotypics,
         dry_run=args.dry_run,
+        workers=args.workers,
     )
 
 
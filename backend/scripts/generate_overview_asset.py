@@ -2,7 +2,11 @@
 """Generate the static overview_data.json asset for the frontend overview tab."""
 
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 
 import numpy as np
@@ -23,17 +27,47 @@ OUTPUT_PATH = Path(__file__).parent.parent.parent / "frontend" / "public" / "ove
 
 METHODS = [CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN, CorrelationMethod.WAVELET]
 
-
-def extract_weights(matrix: np.ndarray, symmetric: bool) -> list[float]:
-    n = matrix.shape[0]
-    weights = []
-    for i in range(n):
-        j_start = i + 1 if symmetric else 0
-        for j in range(j_start, n):
-            if i == j:
-                continue
-            weights.append(round(float(matrix[i, j]), 4))
-    return weights
+# Weights (all within [-1, 1]) are stored as int16 multiples of 1/WEIGHT_SCALE:
+# the same 4 decimals as before, without the "0." and trailing digits in the JSON
+WEIGHT_SCALE = 10000
+
+
+@lru_cache(maxsize=None)
+def _edge_indices(n: int, symmetric: bool) -> tuple[np.ndarray, np.ndarray]:
+    # Both come out row-major, matching the API's edge order
+    if symmetric:
+        return np.triu_indices(n, k=1)
+    rows, cols = np.nonzero(~np.eye(n, dtype=bool))
+    return rows, cols
+
+
+def extract_weights(matrix: np.ndarray, symmetric: bool) -> np.ndarray:
+    rows, cols = _edge_indices(matrix.shape[0], symmetric)
+    weights = matrix[rows, cols].astype(np.float64)
+    # A NaN (e.g. Pearson on a constant RSN column) would cast to an arbitrary
+    # int16 and silently skew the subject's and the method's range
+    if not np.isfinite(weights).all():
+        raise ValueError("Non-finite edge weights")
+    return np.round(weights * WEIGHT_SCALE).astype(np.int16)
+
+
+def process_subject(
+    path_key: str, params: CorrelationParams
+) -> tuple[np.ndarray, float, float] | str:
+    """Edge weights and their range for one subject, or the error message on failure."""
+    try:
+        matrices = compute_correlation_matrices(DATA_DIR / path_key, params)
+        if len(matrices) != 1:
+            raise RuntimeError(f"Expected 1 matrix, got {len(matrices)}")
+
+        weights = extract_weights(matrices[0], is_symmetric(params.method))
+        return (
+            weights,
+            float(weights.min()) / WEIGHT_SCALE,
+            float(weights.max()) / WEIGHT_SCALE,
+        )
+    except Exception as e:
+        return str(e)
 
 
 def main():
@@ -45,94 +79,89 @@ def main():
     rsn_full_names = get_rsn_labels(short=False)
 
     methods_info: dict[str, dict] = {}
-    # subject_path -> { method_name -> { w, min, max } }
-    subject_method_data: dict[str, dict[str, dict]] = {}
-
-    for method in METHODS:
-        method_name = method.value
-        symmetric = is_symmetric(method)
-        edge_count = 91 if symmetric else 182
-        params = CorrelationParams(method=method)
-
-        global_min = float("inf")
-        global_max = float("-inf")
-        success_count = 0
-        error_count = 0
-
-        print(f"\nProcessing {method_name}...", file=sys.stderr)
-
-        for idx, file_info in enumerate(files):
-            file_path = DATA_DIR / file_info["path"]
-            path_key = file_info["path"]
-
-            if path_key not in subject_method_data:
-                subject_method_data[path_key] = {}
-
-            try:
-                matrices = compute_correlation_matrices(file_path, params)
-                if len(matrices) != 1:
-                    raise RuntimeError(f"Expected 1 matrix, got {len(matrices)}")
-
-                matrix = matrices[0]
-                weights = extract_weights(matrix, symmetric)
-                w_min = min(weights)
-                w_max = max(weights)
-
-                subject_method_data[path_key][method_name] = {
-                    "w": weights,
-                    "min": round(w_min, 4),
-                    "max": round(w_max, 4),
-                }
-
-                global_min = min(global_min, w_min)
-                global_max = max(global_max, w_max)
-                success_count += 1
-            except Exception as e:
-                error_count += 1
-                print(f"  Error for {path_key}: {e}", file=sys.stderr)
-
-            if (idx + 1) % 100 == 0 or idx + 1 == len(files):
-                print(f"  {method_name}: {idx + 1}/{len(files)} subjects processed", file=sys.stderr)
-
-        methods_info[method_name] = {
-            "symmetric": symmetric,
-            "edge_count": edge_count,
-            "global_min": round(global_min, 4),
-            "global_max": round(global_max, 4),
-        }
-
-        print(f"  {method_name}: {success_count} ok, {error_count} errors, range [{global_min:.4f}, {global_max:.4f}]", file=sys.stderr)
-
-    subjects = []
-    for file_info in files:
-        path_key = file_info["path"]
-        entry: dict = {
-            "path": file_info["path"],
-            "subject_id": file_info["subject_id"],
-            "site": file_info["site"],
-            "version": file_info["version"],
-            "diagnosis": file_info["diagnosis"],
-        }
-        method_data = subject_method_data.get(path_key, {})
-        for method_name, data in method_data.items():
-            entry[method_name] = data
-        subjects.append(entry)
-
-    asset = {
-        "version": 1,
+    # Indexed like files: { method_name -> { w, min, max } } per subject
+    subject_method_data: list[dict[str, dict]] = [{} for _ in files]
+    path_keys = [file_info["path"] for file_info in files]
+
+    # Subjects are independent, so spread them over every core; map keeps
+    # results in file order and chunksize amortizes the per-task IPC
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for method in METHODS:
+            method_name = method.value
+            symmetric = is_symmetric(method)
+            edge_count = 91 if symmetric else 182
+            params = CorrelationParams(method=method)
+
+            global_min = float("inf")
+            global_max = float("-inf")
+            success_count = 0
+            error_count = 0
+
+            print(f"\nProcessing {method_name}...", file=sys.stderr)
+
+            results = executor.map(
+                process_subject, path_keys, repeat(params), chunksize=8
+            )
+            for idx, (path_key, result) in enumerate(zip(path_keys, results)):
+                if isinstance(result, str):
+                    error_count += 1
+                    print(f"  Error for {path_key}: {result}", file=sys.stderr)
+                else:
+                    weights, w_min, w_max = result
+                    subject_method_data[idx][method_name] = {
+                        "w": weights,
+                        "min": round(w_min, 4),
+                        "max": round(w_max, 4),
+                    }
+
+                    global_min = min(global_min, w_min)
+                    global_max = max(global_max, w_max)
+                    success_count += 1
+
+                if (idx + 1) % 100 == 0 or idx + 1 == len(files):
+                    print(f"  {method_name}: {idx + 1}/{len(files)} subjects processed", file=sys.stderr)
+
+            methods_info[method_name] = {
+                "symmetric": symmetric,
+                "edge_count": edge_count,
+                "global_min": round(global_min, 4),
+                "global_max": round(global_max, 4),
+            }
+
+            print(f"  {method_name}: {success_count} ok, {error_count} errors, range [{global_min:.4f}, {global_max:.4f}]", file=sys.stderr)
+
+    header = {
+        "version": 2,
+        "weight_scale": WEIGHT_SCALE,
         "rsn_labels": rsn_labels,
         "rsn_full_names": rsn_full_names,
         "methods": methods_info,
-        "subjects": subjects,
     }
 
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Subjects are encoded and written one at a time, so the whole document
+    # never sits in memory as a single string; the bytes match a plain dumps
     with open(OUTPUT_PATH, "w") as f:
-        json.dump(asset, f, separators=(",", ":"))
+        f.write(json.dumps(header, separators=(",", ":"))[:-1])
+        f.write(',"subjects":[')
+        for idx, file_info in enumerate(files):
+            entry: dict = {
+                "path": file_info["path"],
+                "subject_id": file_info["subject_id"],
+                "site": file_info["site"],
+                "version": file_info["version"],
+                "diagnosis": file_info["diagnosis"],
+            }
+            for method_name, data in subject_method_data[idx].items():
+                entry[method_name] = {**data, "w": data["w"].tolist()}
+            if idx:
+                f.write(",")
+            f.write(json.dumps(entry, separators=(",", ":")))
+        f.write("]}")
 
     size_mb = OUTPUT_PATH.stat().st_size / (1024 * 1024)
     print(f"\nWrote {OUTPUT_PATH} ({size_mb:.1f} MB)", file=sys.stderr)
-    print(f"Subjects: {len(subjects)}, Methods: {list(methods_info.keys())}", file=sys.stderr)
+    print(f"Subjects: {len(files)}, Methods: {list(methods_info.keys())}", file=sys.stderr)
 
 
 if __name__ == "__main__":
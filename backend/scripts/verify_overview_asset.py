@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
 """Verify that overview_data.json matches the live /abide/data API for every subject."""
 
+import argparse
 import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from fastapi.testclient import TestClient
 
-from app.main import app, DATA_DIR
-from app.abide_processing import get_rsn_labels, is_symmetric, list_subject_files
-from app.rsn_constants import CorrelationMethod
+from app.main import app, build_graph_data, DATA_DIR
+from app.abide_processing import (
+    compute_correlation_matrices,
+    get_rsn_labels,
+    is_symmetric,
+    list_subject_files,
+)
+from app.rsn_constants import CorrelationMethod, CorrelationParams
 
 ASSET_PATH = Path(__file__).parent.parent.parent / "frontend" / "public" / "overview_data.json"
 
 
 def main():
-    client = TestClient(app)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--via-api",
+        action="store_true",
+        help="Go through POST /abide/data instead of calling the pipeline directly",
+    )
+    args = parser.parse_args()
+
+    client = TestClient(app) if args.via_api else None
 
     with open(ASSET_PATH) as f:
         asset = json.load(f)
@@ -31,6 +49,8 @@ def main():
     print("RSN labels: OK")
 
     asset_by_path = {s["path"]: s for s in asset["subjects"]}
+    # Version 2 assets store weights as integers scaled by weight_scale
+    weight_scale = asset.get("weight_scale", 1)
     n = len(rsn_labels)
 
     def expected_edge_order(symmetric):
@@ -47,83 +67,124 @@ def main():
     total_checked = 0
     errors = []
 
-    for method in methods:
-        symmetric = is_symmetric(CorrelationMethod(method))
-        edge_order = expected_edge_order(symmetric)
-        expected_edge_count = len(edge_order)
-
-        method_info = asset["methods"][method]
-        assert method_info["symmetric"] == symmetric, f"{method} symmetric mismatch"
-        assert method_info["edge_count"] == expected_edge_count, f"{method} edge_count mismatch"
-
-        for fi, file_info in enumerate(files):
-            path = file_info["path"]
-
+    def fetch(method, path):
+        if client is not None:
             resp = client.post("/abide/data", json={"file_path": path, "method": method})
             assert resp.status_code == 200, f"API failed for {path} {method}: {resp.status_code}"
-            api_data = resp.json()
-
-            assert len(api_data["frames"]) == 1, f"{path}/{method}: expected 1 frame"
-            api_edges = api_data["frames"][0]["edges"]
-            api_nodes = api_data["frames"][0]["nodes"]
-            api_meta = api_data["meta"]
-
-            asset_subject = asset_by_path[path]
-            method_data = asset_subject.get(method)
-            if method_data is None:
-                errors.append(f"{path}/{method}: missing from asset")
-                continue
-
-            asset_weights = method_data["w"]
-            asset_min = method_data["min"]
-            asset_max = method_data["max"]
-
-            # Edge count
-            if len(api_edges) != len(asset_weights) or len(api_edges) != expected_edge_count:
-                errors.append(
-                    f"{path}/{method}: edge count API={len(api_edges)} "
-                    f"asset={len(asset_weights)} expected={expected_edge_count}"
-                )
-                continue
-
-            # Edge weights (within rounding of round(..., 4))
-            for ei, (api_edge, asset_w) in enumerate(zip(api_edges, asset_weights)):
-                diff = abs(api_edge["weight"] - asset_w)
-                if diff >= 0.00015:
-                    errors.append(
-                        f"{path}/{method} edge {ei}: "
-                        f"API={api_edge['weight']:.6f} asset={asset_w:.6f} diff={diff:.8f}"
-                    )
-
-            # Edge source/target order
-            for ei, (api_edge, (exp_src, exp_tgt)) in enumerate(zip(api_edges, edge_order)):
-                if api_edge["source"] != exp_src or api_edge["target"] != exp_tgt:
-                    errors.append(
-                        f"{path}/{method} edge {ei}: "
-                        f"order ({api_edge['source']},{api_edge['target']}) "
-                        f"!= ({exp_src},{exp_tgt})"
-                    )
-
-            # Node structure
-            for ni, api_node in enumerate(api_nodes):
-                if api_node["id"] != rsn_labels[ni]:
-                    errors.append(f"{path}/{method} node {ni}: id mismatch")
-                if api_node["full_name"] != rsn_full_names[ni]:
-                    errors.append(f"{path}/{method} node {ni}: full_name mismatch")
-
-            # Per-subject min/max
-            if abs(api_meta["edge_weight_min"] - asset_min) >= 0.00015:
-                errors.append(
-                    f"{path}/{method}: min API={api_meta['edge_weight_min']} asset={asset_min}"
-                )
-            if abs(api_meta["edge_weight_max"] - asset_max) >= 0.00015:
-                errors.append(
-                    f"{path}/{method}: max API={api_meta['edge_weight_max']} asset={asset_max}"
-                )
-
-            total_checked += 1
-            if (fi + 1) % 100 == 0 or fi + 1 == len(files):
-                print(f"  {method}: {fi + 1}/{len(files)} verified", flush=True)
+            return resp.json()
+
+        # Same pipeline and response builder as the endpoint, minus the
+        # request/response JSON round trip
+        corr_method = CorrelationMethod(method)
+        matrices = compute_correlation_matrices(
+            DATA_DIR / path, CorrelationParams(method=corr_method)
+        )
+        return build_graph_data(
+            matrices,
+            symmetric=is_symmetric(corr_method),
+            file_path=path,
+            method=method,
+        )
+
+    # Requests are independent and the endpoint's work is mostly NumPy/HDF5
+    # C code, so a thread pool overlaps them; results are read back in file order
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for method in methods:
+            symmetric = is_symmetric(CorrelationMethod(method))
+            edge_order = expected_edge_order(symmetric)
+            expected_edge_count = len(edge_order)
+            expected_sources = [src for src, _ in edge_order]
+            expected_targets = [tgt for _, tgt in edge_order]
+
+            method_info = asset["methods"][method]
+            assert method_info["symmetric"] == symmetric, f"{method} symmetric mismatch"
+            assert method_info["edge_count"] == expected_edge_count, f"{method} edge_count mismatch"
+
+            paths = [file_info["path"] for file_info in files]
+            futures = [executor.submit(fetch, method, path) for path in paths]
+            try:
+                for fi, (path, future) in enumerate(zip(paths, futures)):
+                    api_data = future.result()
+                    assert len(api_data["frames"]) == 1, f"{path}/{method}: expected 1 frame"
+                    api_edges = api_data["frames"][0]["edges"]
+                    api_nodes = api_data["frames"][0]["nodes"]
+                    api_meta = api_data["meta"]
+
+                    asset_subject = asset_by_path[path]
+                    method_data = asset_subject.get(method)
+                    if method_data is None:
+                        errors.append(f"{path}/{method}: missing from asset")
+                        continue
+
+                    asset_weights = method_data["w"]
+                    asset_min = method_data["min"]
+                    asset_max = method_data["max"]
+
+                    # Edge count
+                    if len(api_edges) != len(asset_weights) or len(api_edges) != expected_edge_count:
+                        errors.append(
+                            f"{path}/{method}: edge count API={len(api_edges)} "
+                            f"asset={len(asset_weights)} expected={expected_edge_count}"
+                        )
+                        continue
+
+                    # One pass over the edge dicts feeds all the checks below
+                    n_edges = len(api_edges)
+                    api_w = np.empty(n_edges, dtype=np.float64)
+                    api_sources = [None] * n_edges
+                    api_targets = [None] * n_edges
+                    for ei, api_edge in enumerate(api_edges):
+                        api_w[ei] = api_edge["weight"]
+                        api_sources[ei] = api_edge["source"]
+                        api_targets[ei] = api_edge["target"]
+
+                    # Edge weights (within rounding of round(..., 4)); only the
+                    # mismatching edges drop back to Python to build messages
+                    asset_w = np.asarray(asset_weights, dtype=np.float64) / weight_scale
+                    diffs = np.abs(api_w - asset_w)
+                    for ei in np.flatnonzero(diffs >= 0.00015):
+                        errors.append(
+                            f"{path}/{method} edge {ei}: "
+                            f"API={api_w[ei]:.6f} asset={asset_w[ei]:.6f} diff={diffs[ei]:.8f}"
+                        )
+
+                    # Edge source/target order
+                    if api_sources != expected_sources or api_targets != expected_targets:
+                        edge_pairs = zip(api_sources, api_targets, edge_order)
+                        for ei, (src, tgt, (exp_src, exp_tgt)) in enumerate(edge_pairs):
+                            if src != exp_src or tgt != exp_tgt:
+                                errors.append(
+                                    f"{path}/{method} edge {ei}: "
+                                    f"order ({src},{tgt}) != ({exp_src},{exp_tgt})"
+                                )
+
+                    # Node structure
+                    api_ids = [node["id"] for node in api_nodes]
+                    api_full_names = [node["full_name"] for node in api_nodes]
+                    if api_ids != rsn_labels or api_full_names != rsn_full_names:
+                        for ni, api_node in enumerate(api_nodes):
+                            if api_node["id"] != rsn_labels[ni]:
+                                errors.append(f"{path}/{method} node {ni}: id mismatch")
+                            if api_node["full_name"] != rsn_full_names[ni]:
+                                errors.append(f"{path}/{method} node {ni}: full_name mismatch")
+
+                    # Per-subject min/max
+                    if abs(api_meta["edge_weight_min"] - asset_min) >= 0.00015:
+                        errors.append(
+                            f"{path}/{method}: min API={api_meta['edge_weight_min']} asset={asset_min}"
+                        )
+                    if abs(api_meta["edge_weight_max"] - asset_max) >= 0.00015:
+                        errors.append(
+                            f"{path}/{method}: max API={api_meta['edge_weight_max']} asset={asset_max}"
+                        )
+
+                    total_checked += 1
+                    if (fi + 1) % 100 == 0 or fi + 1 == len(files):
+                        print(f"  {method}: {fi + 1}/{len(files)} verified", flush=True)
+            finally:
+                # Drop the still-queued requests if a check fails
+                for future in futures:
+                    future.cancel()
 
     print(f"\nTotal subject-method pairs verified: {total_checked}")
     if errors:
@@ -1,8 +1,7 @@
-import shutil
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Generator
-from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -11,43 +10,54 @@ from fastapi.testclient import TestClient
 import app.abide_processing as processing_module
 import app.main as main_module
 from app.main import app
-from tests.utils import generate_abide_timeseries
+from tests.utils import format_dr_file, generate_abide_timeseries
 
 
 def create_test_phenotypics(data_dir: Path, subjects: list[tuple[int, str]]) -> Path:
     phenotypics_path = data_dir / "phenotypics.csv"
-    with open(phenotypics_path, "w") as f:
-        f.write("partnum,diagnosis\n")
-        for subject_id, diagnosis in subjects:
-            f.write(f"{subject_id},{diagnosis}\n")
+    rows = "".join(f"{subject_id},{diagnosis}\n" for subject_id, diagnosis in subjects)
+    phenotypics_path.write_bytes(("partnum,diagnosis\n" + rows).encode())
     return phenotypics_path
 
 
-@pytest.fixture(autouse=True)
-def mock_data_paths(tmp_path: Path) -> Generator[None, None, None]:
-    """Mocks DATA_DIR and PHENOTYPICS_FILE_PATH to temp directories."""
-    phenotypics_path = tmp_path / "phenotypics.csv"
-    phenotypics_path.write_text("partnum,diagnosis\n")
+# The synthetic subjects are deterministic, so their text is generated and
+# formatted once per session; fixtures only write the cached strings
+@lru_cache(maxsize=None)
+def sample_dr_texts(n_subjects: int) -> tuple[str, ...]:
+    # One generator for every subject: consecutive draws are independent,
+    # so subjects stay decorrelated without re-seeding per file
+    rng = np.random.default_rng(42)
+    return tuple(
+        format_dr_file(generate_abide_timeseries(n_timepoints=100, rng=rng))
+        for _ in range(n_subjects)
+    )
 
-    # Create empty data dir
-    data_dir = tmp_path / "data"
-    data_dir.mkdir()
 
-    with patch.object(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path), \
-         patch.object(main_module, "DATA_DIR", data_dir):
-        yield
+@lru_cache(maxsize=None)
+def single_dr_text() -> str:
+    return format_dr_file(generate_abide_timeseries(n_timepoints=100, seed=42))
 
 
-@pytest.fixture
-def temp_data_dir() -> Generator[Path, None, None]:
-    temp_dir = Path(tempfile.mkdtemp())
-    yield temp_dir
-    shutil.rmtree(temp_dir)
+# Deterministic per seed, so generated once per session; read-only so a
+# test can't leak changes into the next one
+@pytest.fixture(scope="session")
+def sample_data_14() -> np.ndarray:
+    data = generate_abide_timeseries(n_timepoints=50, n_components=14, seed=42)
+    data.setflags(write=False)
+    return data
 
 
-@pytest.fixture
-def sample_abide_structure(temp_data_dir: Path) -> Path:
-    np.random.seed(42)
+@pytest.fixture(scope="session")
+def sample_data_100() -> np.ndarray:
+    data = generate_abide_timeseries(n_timepoints=100, n_components=14, seed=42)
+    data.setflags(write=False)
+    return data
+
+
+@pytest.fixture(scope="session")
+def sample_abide_structure(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Built once per session; tests only read from it."""
+    data_dir = tmp_path_factory.mktemp("abide")
 
     # Define test subjects with their diagnoses
     test_subjects = [
@@ -58,7 +68,7 @@ def sample_abide_structure(temp_data_dir: Path) -> Path:
     ]
 
     # Create phenotypics.csv with test subjects
-    create_test_phenotypics(temp_data_dir, test_subjects)
+    create_test_phenotypics(data_dir, test_subjects)
 
     # Create ABIDE file structure
     sites = [
@@ -67,42 +77,80 @@ def sample_abide_structure(temp_data_dir: Path) -> Path:
         ("ABIDE_I", "CMU2", ["0050659"]),
     ]
 
-    for version, site, subjects in sites:
-        site_dir = temp_data_dir / "ABIDE" / version / site
+    # Each distinct site directory is created once, before any file paths
+    for site_dir in {data_dir / "ABIDE" / version / site for version, site, _ in sites}:
         site_dir.mkdir(parents=True, exist_ok=True)
 
-        for subject_id in subjects:
-            filepath = site_dir / f"dr_stage1_subject{subject_id}.txt"
-            data = generate_abide_timeseries(n_timepoints=100, seed=int(subject_id))
-            np.savetxt(filepath, data, fmt="%.8f")
+    filepaths = [
+        data_dir / "ABIDE" / version / site / f"dr_stage1_subject{subject_id}.txt"
+        for version, site, subjects in sites
+        for subject_id in subjects
+    ]
 
-    return temp_data_dir
+    texts = sample_dr_texts(len(filepaths))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(Path.write_text, filepaths, texts))
 
+    return data_dir
 
-@pytest.fixture
-def single_abide_file(temp_data_dir: Path) -> Path:
-    phenotypics_path = processing_module.PHENOTYPICS_FILE_PATH
-    phenotypics_path.write_text("partnum,diagnosis\n50001,ASD\n")
 
-    filepath = temp_data_dir / "dr_stage1_subject0050001.txt"
-    data = generate_abide_timeseries(n_timepoints=100, seed=42)
-    np.savetxt(filepath, data, fmt="%.8f")
+@pytest.fixture(scope="session")
+def single_abide_file(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Written once per session; tests only read from it."""
+    filepath = tmp_path_factory.mktemp("single") / "dr_stage1_subject0050001.txt"
+    filepath.write_text(single_dr_text())
     return filepath
 
 
+@pytest.fixture(scope="session")
+def single_abide_parsed(single_abide_file: Path) -> np.ndarray:
+    # parse_dr_file hands out a read-only array, so sharing it is safe
+    return processing_module.parse_dr_file(single_abide_file)
+
+
+@pytest.fixture(scope="session")
+def app_client() -> Generator[TestClient, None, None]:
+    """One client for the session; tests only re-point the data paths."""
+    with TestClient(app) as client:
+        yield client
+
+
 @pytest.fixture
-def test_client(sample_abide_structure: Path) -> Generator[TestClient, None, None]:
+def test_client(
+    app_client: TestClient,
+    sample_abide_structure: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> TestClient:
     phenotypics_path = sample_abide_structure / "phenotypics.csv"
 
-    with patch.object(main_module, "DATA_DIR", sample_abide_structure), \
-         patch.object(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path):
-        yield TestClient(app)
+    monkeypatch.setattr(main_module, "DATA_DIR", sample_abide_structure)
+    monkeypatch.setattr(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path)
+    return app_client
 
 
-@pytest.fixture
-def test_client_empty_data(temp_data_dir: Path) -> Generator[TestClient, None, None]:
-    phenotypics_path = create_test_phenotypics(temp_data_dir, [])
+@pytest.fixture(scope="session")
+def files_listing(app_client: TestClient, sample_abide_structure: Path) -> dict:
+    """GET /abide/files for the sample tree, fetched once per session."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main_module, "DATA_DIR", sample_abide_structure)
+        mp.setattr(
+            processing_module,
+            "PHENOTYPICS_FILE_PATH",
+            sample_abide_structure / "phenotypics.csv",
+        )
+        response = app_client.get("/abide/files")
+    assert response.status_code == 200
+    return response.json()
+
 
-    with patch.object(main_module, "DATA_DIR", temp_data_dir), \
-         patch.object(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path):
-        yield TestClient(app)
+@pytest.fixture
+def test_client_empty_data(
+    app_client: TestClient,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> TestClient:
+    phenotypics_path = create_test_phenotypics(tmp_path, [])
+
+    monkeypatch.setattr(main_module, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path)
+    return app_client
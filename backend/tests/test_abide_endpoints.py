@@ -1,12 +1,59 @@
+import json
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.abide_processing import filter_rsn_columns, parse_dr_file
+
+AbidePost = Callable[[dict], dict]
+
+# /abide/data is a pure function of its body and the session-wide sample
+# tree, so tests that only read the payload share one response per body
+_data_responses: dict[str, dict] = {}
 
 
 @pytest.fixture
-def file_path(test_client: TestClient) -> str:
-    response = test_client.get("/abide/files")
-    files = response.json()["files"]
-    return files[0]["path"]
+def abide_post(test_client: TestClient) -> AbidePost:
+    def post(body: dict) -> dict:
+        key = json.dumps(body, sort_keys=True)
+        if key not in _data_responses:
+            response = test_client.post("/abide/data", json=body)
+            assert response.status_code == 200, response.text
+            _data_responses[key] = response.json()
+        return _data_responses[key]
+
+    return post
+
+
+@pytest.fixture
+def pearson_response(abide_post: AbidePost, file_path: str) -> dict:
+    """Single full-length Pearson frame, shared by the structural assertions."""
+    return abide_post({"file_path": file_path, "method": "pearson"})
+
+
+@pytest.fixture
+def pearson_windowed_30_5(abide_post: AbidePost, file_path: str) -> dict:
+    return abide_post(
+        {"file_path": file_path, "method": "pearson", "window_size": 30, "step": 5}
+    )
+
+
+def _frame_weights(data: dict, frame: int) -> tuple[float, ...]:
+    return tuple(edge["weight"] for edge in data["frames"][frame]["edges"])
+
+
+@pytest.fixture(scope="session")
+def file_path(files_listing: dict) -> str:
+    return files_listing["files"][0]["path"]
+
+
+@pytest.fixture(scope="session")
+def n_timepoints(sample_abide_structure: Path, file_path: str) -> int:
+    return parse_dr_file(sample_abide_structure / file_path).shape[0]
 
 
 # --- GET /abide/files ---
@@ -21,9 +68,8 @@ def test_list_files_returns_expected_structure(test_client: TestClient):
     assert isinstance(data["files"], list)
 
 
-def test_list_files_finds_all_fixture_files(test_client: TestClient):
-    response = test_client.get("/abide/files")
-    files = response.json()["files"]
+def test_list_files_finds_all_fixture_files(files_listing: dict):
+    files = files_listing["files"]
 
     assert len(files) == 4
 
@@ -35,9 +81,8 @@ def test_list_files_finds_all_fixture_files(test_client: TestClient):
         assert file_info["diagnosis"] in ("ASD", "HC")
 
 
-def test_list_files_extracts_site_and_version(test_client: TestClient):
-    response = test_client.get("/abide/files")
-    files = response.json()["files"]
+def test_list_files_extracts_site_and_version(files_listing: dict):
+    files = files_listing["files"]
 
     nyu_files = [f for f in files if f["site"] == "NYU"]
     assert len(nyu_files) == 2
@@ -57,24 +102,15 @@ def test_list_files_returns_empty_when_no_files(test_client_empty_data: TestClie
 
 # --- POST /abide/data ---
 
-def test_get_data_returns_frames_and_meta(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson"}
-    )
+def test_get_data_returns_frames_and_meta(pearson_response: dict):
+    data = pearson_response
 
-    assert response.status_code == 200
-    data = response.json()
     assert "frames" in data
     assert "meta" in data
 
 
-def test_get_data_frames_have_correct_structure(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30, "step": 5}
-    )
-    frames = response.json()["frames"]
+def test_get_data_frames_have_correct_structure(pearson_windowed_30_5: dict):
+    frames = pearson_windowed_30_5["frames"]
 
     assert len(frames) > 0
     frame = frames[0]
@@ -84,12 +120,8 @@ def test_get_data_frames_have_correct_structure(test_client: TestClient, file_pa
     assert "metadata" in frame
 
 
-def test_get_data_returns_14_rsn_nodes(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson"}
-    )
-    nodes = response.json()["frames"][0]["nodes"]
+def test_get_data_returns_14_rsn_nodes(pearson_response: dict):
+    nodes = pearson_response["frames"][0]["nodes"]
 
     assert len(nodes) == 14
     for node in nodes:
@@ -98,63 +130,42 @@ def test_get_data_returns_14_rsn_nodes(test_client: TestClient, file_path: str):
         assert "degree" in node
 
 
-def test_get_data_both_correlation_methods_work(test_client: TestClient, file_path: str):
-    for method in ["pearson", "spearman"]:
-        response = test_client.post(
-            "/abide/data",
-            json={"file_path": file_path, "method": method, "window_size": 20}
-        )
-        assert response.status_code == 200, f"Method {method} failed"
-
-
-def test_get_data_smaller_window_produces_more_frames(test_client: TestClient, file_path: str):
-    response_small = test_client.post(
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_get_data_both_correlation_methods_work(
+    test_client: TestClient, file_path: str, method: str
+):
+    response = test_client.post(
         "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 20, "step": 1}
+        json={"file_path": file_path, "method": method, "window_size": 20}
     )
-    response_large = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 50, "step": 1}
+    assert response.status_code == 200, f"Method {method} failed"
+
+
+@pytest.mark.parametrize("window_size, step", [(20, 1), (50, 1), (30, 1), (30, 5)])
+def test_get_data_frame_count_follows_window_and_step(
+    abide_post: AbidePost,
+    file_path: str,
+    n_timepoints: int,
+    window_size: int,
+    step: int,
+):
+    data = abide_post(
+        {"file_path": file_path, "method": "pearson", "window_size": window_size, "step": step}
     )
 
-    frames_small = len(response_small.json()["frames"])
-    frames_large = len(response_large.json()["frames"])
-    assert frames_small > frames_large
+    # Exact count, so smaller windows and steps giving more frames follows
+    assert len(data["frames"]) == (n_timepoints - window_size) // step + 1
 
 
-def test_get_data_omitted_window_size_returns_single_frame(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson"}
-    )
+def test_get_data_omitted_window_size_returns_single_frame(pearson_response: dict):
+    data = pearson_response
 
-    assert response.status_code == 200
-    data = response.json()
     assert len(data["frames"]) == 1
     assert data["frames"][0]["metadata"]["window_size"] == "full"
 
 
-def test_get_data_smaller_step_produces_more_frames(test_client: TestClient, file_path: str):
-    response_step1 = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30, "step": 1}
-    )
-    response_step5 = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30, "step": 5}
-    )
-
-    frames_step1 = len(response_step1.json()["frames"])
-    frames_step5 = len(response_step5.json()["frames"])
-    assert frames_step1 > frames_step5
-
-
-def test_get_data_meta_has_correct_structure(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson"}
-    )
-    meta = response.json()["meta"]
+def test_get_data_meta_has_correct_structure(pearson_response: dict):
+    meta = pearson_response["meta"]
 
     assert "frame_count" in meta
     assert meta["frame_count"] > 0
@@ -166,35 +177,43 @@ def test_get_data_meta_has_correct_structure(test_client: TestClient, file_path:
     assert -1.0 <= meta["edge_weight_min"] <= meta["edge_weight_max"] <= 1.0
 
 
-def test_get_data_all_smoothing_methods_work(test_client: TestClient, file_path: str):
-    # Test without smoothing (None)
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson"}
-    )
-    assert response.status_code == 200, "No smoothing failed"
-
-    # Test each smoothing algorithm
-    for algo in ["moving_average", "exponential", "gaussian"]:
-        response = test_client.post(
-            "/abide/data",
-            json={
-                "file_path": file_path,
-                "method": "pearson",
-                "smoothing": {"algorithm": algo}
-            }
+def test_pearson_matches_zscored_matmul(
+    pearson_windowed_30_5: dict, sample_abide_structure: Path, file_path: str
+):
+    data = filter_rsn_columns(parse_dr_file(sample_abide_structure / file_path))
+
+    # Every window z-scored along time, then all pairs at once as one matmul
+    windows = sliding_window_view(data, 30, axis=0)[::5]
+    z = windows - windows.mean(axis=2, keepdims=True)
+    z /= z.std(axis=2, ddof=1, keepdims=True)
+    expected = z @ z.transpose(0, 2, 1) / (30 - 1)
+
+    frames = pearson_windowed_30_5["frames"]
+    assert len(frames) == len(expected)
+    # Symmetric edges are the upper triangle, row-major
+    rows, cols = np.triu_indices(data.shape[1], k=1)
+    for frame, matrix in enumerate(expected):
+        np.testing.assert_allclose(
+            _frame_weights(pearson_windowed_30_5, frame), matrix[rows, cols], atol=1e-5
         )
-        assert response.status_code == 200, f"Smoothing {algo} failed"
 
 
-def test_get_data_interpolation_increases_frame_count(test_client: TestClient, file_path: str):
-    response_none = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30}
-    )
-    response_interp = test_client.post(
-        "/abide/data",
-        json={
+@pytest.mark.parametrize("algo", [None, "moving_average", "exponential", "gaussian"])
+def test_get_data_all_smoothing_methods_work(
+    test_client: TestClient, file_path: str, algo: str | None
+):
+    payload: dict[str, Any] = {"file_path": file_path, "method": "pearson"}
+    if algo is not None:
+        payload["smoothing"] = {"algorithm": algo}
+
+    response = test_client.post("/abide/data", json=payload)
+    assert response.status_code == 200, f"Smoothing {algo} failed"
+
+
+def test_get_data_interpolation_increases_frame_count(abide_post: AbidePost, file_path: str):
+    data_none = abide_post({"file_path": file_path, "method": "pearson", "window_size": 30})
+    data_interp = abide_post(
+        {
             "file_path": file_path,
             "method": "pearson",
             "window_size": 30,
@@ -202,31 +221,21 @@ def test_get_data_interpolation_increases_frame_count(test_client: TestClient, f
         }
     )
 
-    assert response_none.status_code == 200
-    assert response_interp.status_code == 200
-    assert len(response_interp.json()["frames"]) > len(response_none.json()["frames"])
+    assert len(data_interp["frames"]) > len(data_none["frames"])
 
 
-def test_get_data_all_interpolation_methods_work(test_client: TestClient, file_path: str):
-    # Test without interpolation (None)
-    response = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30}
-    )
-    assert response.status_code == 200, "No interpolation failed"
+@pytest.mark.parametrize(
+    "algo", [None, "linear", "cubic_spline", "b_spline", "univariate_spline"]
+)
+def test_get_data_all_interpolation_methods_work(
+    test_client: TestClient, file_path: str, algo: str | None
+):
+    payload: dict[str, Any] = {"file_path": file_path, "method": "pearson", "window_size": 30}
+    if algo is not None:
+        payload["interpolation"] = {"algorithm": algo, "factor": 2}
 
-    # Test each interpolation algorithm
-    for algo in ["linear", "cubic_spline", "b_spline", "univariate_spline"]:
-        response = test_client.post(
-            "/abide/data",
-            json={
-                "file_path": file_path,
-                "method": "pearson",
-                "window_size": 30,
-                "interpolation": {"algorithm": algo, "factor": 2}
-            }
-        )
-        assert response.status_code == 200, f"Interpolation {algo} failed"
+    response = test_client.post("/abide/data", json=payload)
+    assert response.status_code == 200, f"Interpolation {algo} failed"
 
 
 def test_get_data_full_processing_pipeline(test_client: TestClient, file_path: str):
@@ -270,6 +279,16 @@ def test_get_data_400_for_invalid_method(test_client: TestClient, file_path: str
     assert response.status_code == 400
 
 
+def test_get_data_400_for_invalid_method_before_missing_file(test_client: TestClient):
+    # The method is validated first, so a bad request is rejected without
+    # touching the filesystem
+    response = test_client.post(
+        "/abide/data",
+        json={"file_path": "nonexistent/file.txt", "method": "invalid_method"}
+    )
+    assert response.status_code == 400
+
+
 def test_get_data_400_for_window_size_too_large(test_client: TestClient, file_path: str):
     response = test_client.post(
         "/abide/data",
@@ -322,182 +341,121 @@ def test_get_data_422_for_interpolation_factor_out_of_range(test_client: TestCli
     assert response.status_code == 422
 
 
-def test_get_data_smoothing_params_are_configurable(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "smoothing": {"algorithm": "moving_average", "window": 5}
-        }
-    )
-    assert response.status_code == 200
-
-    response = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "smoothing": {"algorithm": "exponential", "alpha": 0.3}
-        }
-    )
-    assert response.status_code == 200
-
+@pytest.mark.parametrize(
+    "smoothing",
+    [
+        {"algorithm": "moving_average", "window": 5},
+        {"algorithm": "exponential", "alpha": 0.3},
+        {"algorithm": "gaussian", "sigma": 2.0},
+    ],
+)
+def test_get_data_smoothing_params_are_configurable(
+    test_client: TestClient, file_path: str, smoothing: dict
+):
     response = test_client.post(
         "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "smoothing": {"algorithm": "gaussian", "sigma": 2.0}
-        }
+        json={"file_path": file_path, "method": "pearson", "smoothing": smoothing}
     )
     assert response.status_code == 200
 
 
-def test_get_data_422_for_smoothing_params_out_of_range(test_client: TestClient, file_path: str):
-    response = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "smoothing": {"algorithm": "moving_average", "window": 100}
-        }
-    )
-    assert response.status_code == 422
-
+@pytest.mark.parametrize(
+    "smoothing",
+    [
+        {"algorithm": "moving_average", "window": 100},
+        {"algorithm": "exponential", "alpha": 2.0},
+    ],
+)
+def test_get_data_422_for_smoothing_params_out_of_range(
+    test_client: TestClient, file_path: str, smoothing: dict
+):
     response = test_client.post(
         "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "smoothing": {"algorithm": "exponential", "alpha": 2.0}
-        }
+        json={"file_path": file_path, "method": "pearson", "smoothing": smoothing}
     )
     assert response.status_code == 422
 
 
 # --- Smoothing behavior tests ---
 
-def test_smoothing_changes_edge_weights(test_client: TestClient, file_path: str):
-    no_smooth = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30}
-    ).json()
+def test_smoothing_changes_edge_weights(abide_post: AbidePost, file_path: str):
+    no_smooth = abide_post({"file_path": file_path, "method": "pearson", "window_size": 30})
 
-    with_smooth = test_client.post(
-        "/abide/data",
-        json={
+    with_smooth = abide_post(
+        {
             "file_path": file_path,
             "method": "pearson",
             "window_size": 30,
             "smoothing": {"algorithm": "gaussian", "sigma": 2.0}
         }
-    ).json()
+    )
 
     # Same number of frames
     assert len(no_smooth["frames"]) == len(with_smooth["frames"])
 
     # But edge weights should differ (smoothing averages neighboring values)
-    no_smooth_weights = [e["weight"] for e in no_smooth["frames"][1]["edges"]]
-    smooth_weights = [e["weight"] for e in with_smooth["frames"][1]["edges"]]
-    assert no_smooth_weights != smooth_weights
-
-
-def test_different_smoothing_params_produce_different_results(test_client: TestClient, file_path: str):
-    result_sigma1 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "gaussian", "sigma": 0.5}
-        }
-    ).json()
-
-    result_sigma3 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "gaussian", "sigma": 3.0}
-        }
-    ).json()
-
-    weights_sigma1 = [e["weight"] for e in result_sigma1["frames"][1]["edges"]]
-    weights_sigma3 = [e["weight"] for e in result_sigma3["frames"][1]["edges"]]
-    assert weights_sigma1 != weights_sigma3
-
-
-def test_moving_average_window_affects_output(test_client: TestClient, file_path: str):
-    result_w2 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "moving_average", "window": 2}
-        }
-    ).json()
-
-    result_w5 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "moving_average", "window": 5}
-        }
-    ).json()
-
-    weights_w2 = [e["weight"] for e in result_w2["frames"][2]["edges"]]
-    weights_w5 = [e["weight"] for e in result_w5["frames"][2]["edges"]]
-    assert weights_w2 != weights_w5
-
-
-def test_exponential_alpha_affects_output(test_client: TestClient, file_path: str):
-    result_a1 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "exponential", "alpha": 0.1}
-        }
-    ).json()
-
-    result_a9 = test_client.post(
-        "/abide/data",
-        json={
-            "file_path": file_path,
-            "method": "pearson",
-            "window_size": 30,
-            "smoothing": {"algorithm": "exponential", "alpha": 0.9}
-        }
-    ).json()
+    assert _frame_weights(no_smooth, 1) != _frame_weights(with_smooth, 1)
+
+
+@pytest.mark.parametrize(
+    "smoothing_a, smoothing_b, frame",
+    [
+        pytest.param(
+            {"algorithm": "gaussian", "sigma": 0.5},
+            {"algorithm": "gaussian", "sigma": 3.0},
+            1,
+            id="gaussian_sigma",
+        ),
+        pytest.param(
+            {"algorithm": "moving_average", "window": 2},
+            {"algorithm": "moving_average", "window": 5},
+            2,
+            id="moving_average_window",
+        ),
+        pytest.param(
+            {"algorithm": "exponential", "alpha": 0.1},
+            {"algorithm": "exponential", "alpha": 0.9},
+            2,
+            id="exponential_alpha",
+        ),
+    ],
+)
+def test_smoothing_params_affect_output(
+    abide_post: AbidePost,
+    file_path: str,
+    smoothing_a: dict,
+    smoothing_b: dict,
+    frame: int,
+):
+    results = [
+        abide_post(
+            {
+                "file_path": file_path,
+                "method": "pearson",
+                "window_size": 30,
+                "smoothing": smoothing,
+            }
+        )
+        for smoothing in (smoothing_a, smoothing_b)
+    ]
 
-    weights_a1 = [e["weight"] for e in result_a1["frames"][2]["edges"]]
-    weights_a9 = [e["weight"] for e in result_a9["frames"][2]["edges"]]
-    assert weights_a1 != weights_a9
+    weights_a, weights_b = (_frame_weights(result, frame) for result in results)
+    assert weights_a != weights_b
 
 
-def test_smoothing_and_interpolation_combined(test_client: TestClient, file_path: str):
-    base = test_client.post(
-        "/abide/data",
-        json={"file_path": file_path, "method": "pearson", "window_size": 30}
-    ).json()
+def test_smoothing_and_interpolation_combined(abide_post: AbidePost, file_path: str):
+    base = abide_post({"file_path": file_path, "method": "pearson", "window_size": 30})
     base_frames = len(base["frames"])
 
-    combined = test_client.post(
-        "/abide/data",
-        json={
+    combined = abide_post(
+        {
             "file_path": file_path,
             "method": "pearson",
             "window_size": 30,
             "smoothing": {"algorithm": "gaussian", "sigma": 1.5},
             "interpolation": {"algorithm": "linear", "factor": 3}
         }
-    ).json()
+    )
 
     # Interpolation should increase frame count
     expected_frames = (base_frames - 1) * 3 + 1
@@ -1,8 +1,11 @@
+import os
 from pathlib import Path
 
 import numpy as np
 import pytest
+from scipy import stats
 
+import app.abide_processing as processing_module
 from app.abide_processing import (
     CorrelationMethod,
     CorrelationParams,
@@ -13,13 +16,14 @@ from app.abide_processing import (
     compute_correlation_matrices,
     filter_rsn_columns,
     get_rsn_labels,
+    list_subject_files,
     parse_dr_file,
     pearson_matrix,
     spearman_matrix,
     windowed_correlation,
 )
 
-from tests.utils import generate_abide_timeseries
+from tests.utils import format_dr_file, generate_abide_timeseries
 
 
 # --- RSN Constants ---
@@ -41,19 +45,112 @@ def test_rsn_indices_are_valid():
 
 # --- Parsers ---
 
-def test_parse_dr_file(single_abide_file: Path):
-    data = parse_dr_file(single_abide_file)
+def test_parse_dr_file(single_abide_parsed: np.ndarray):
+    data = single_abide_parsed
 
     assert isinstance(data, np.ndarray)
     assert data.ndim == 2
     assert data.shape[1] == 32
 
 
+def test_parse_dr_file_matches_written_values(tmp_path: Path):
+    data = generate_abide_timeseries(n_timepoints=20)
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text(format_dr_file(data))
+
+    # Written with %.6f, so values agree to within half the last digit
+    np.testing.assert_allclose(parse_dr_file(filepath), data, rtol=0, atol=1e-6)
+
+
+def test_parse_dr_file_single_row_stays_2d(tmp_path: Path):
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text(format_dr_file(generate_abide_timeseries(n_timepoints=1)))
+
+    assert parse_dr_file(filepath).shape == (1, 32)
+
+
+def test_parse_dr_file_ignores_surrounding_whitespace(tmp_path: Path):
+    data = generate_abide_timeseries(n_timepoints=3)
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text(
+        "".join("  " + " ".join(f"{v:.6f}" for v in row) + " \t\n" for row in data)
+    )
+
+    parsed = parse_dr_file(filepath)
+    assert parsed.shape == (3, 32)
+    np.testing.assert_allclose(parsed, data, rtol=0, atol=1e-6)
+
+
+def test_parse_dr_file_skips_comment_lines(tmp_path: Path):
+    data = generate_abide_timeseries(n_timepoints=4)
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text("# dual regression stage 1 output\n" + format_dr_file(data))
+
+    parsed = parse_dr_file(filepath)
+    assert parsed.shape == (4, 32)
+    np.testing.assert_allclose(parsed, data, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("content", ["", "# header only\n", "1.0 2.0\n1.0 2.0 3.0\n"])
+def test_parse_dr_file_raises_value_error_for_bad_file(tmp_path: Path, content: str):
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text(content)
+
+    with pytest.raises(ValueError, match="Could not parse DR file"):
+        parse_dr_file(filepath)
+
+
+def test_parse_dr_file_rereads_rewritten_file(tmp_path: Path):
+    filepath = tmp_path / "dr_stage1_subject0050001.txt"
+    filepath.write_text(format_dr_file(generate_abide_timeseries(n_timepoints=5, seed=1)))
+    first = parse_dr_file(filepath)
+
+    rewritten = generate_abide_timeseries(n_timepoints=8, seed=2)
+    filepath.write_text(format_dr_file(rewritten))
+    # Force a distinct mtime even on filesystems with coarse timestamps
+    mtime_ns = filepath.stat().st_mtime_ns + 1_000_000_000
+    os.utime(filepath, ns=(mtime_ns, mtime_ns))
+
+    second = parse_dr_file(filepath)
+    assert first.shape == (5, 32)
+    assert second.shape == (8, 32)
+    np.testing.assert_allclose(second, rewritten, rtol=0, atol=1e-6)
+
+
+def test_parse_dr_file_returns_read_only_array(single_abide_parsed: np.ndarray):
+    assert single_abide_parsed.flags.writeable is False
+
+
+def test_list_subject_files_picks_up_new_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    phenotypics_path = tmp_path / "phenotypics.csv"
+    phenotypics_path.write_text("partnum,diagnosis\n50001,ASD\n50002,HC\n")
+    monkeypatch.setattr(processing_module, "PHENOTYPICS_FILE_PATH", phenotypics_path)
+
+    site_dir = tmp_path / "ABIDE_I" / "NYU"
+    site_dir.mkdir(parents=True)
+    text = format_dr_file(generate_abide_timeseries(n_timepoints=5))
+    (site_dir / "dr_stage1_subject0050001.txt").write_text(text)
+    first = list_subject_files(tmp_path)
+
+    (site_dir / "dr_stage1_subject0050002.txt").write_text(text)
+    # Force a distinct mtime even on filesystems with coarse timestamps
+    mtime_ns = site_dir.stat().st_mtime_ns + 1_000_000_000
+    os.utime(site_dir, ns=(mtime_ns, mtime_ns))
+    second = list_subject_files(tmp_path)
+
+    assert [f["subject_id"] for f in first] == [50001]
+    assert [f["subject_id"] for f in second] == [50001, 50002]
+
+
 def test_filter_rsn_columns():
-    data = np.random.randn(100, 32)
+    # Each column holds its own 0-based index, so the selection is visible
+    data = np.tile(np.arange(32.0), (100, 1))
     filtered = filter_rsn_columns(data)
 
     assert filtered.shape == (100, 14)
+    assert filtered[0].tolist() == [i - 1 for i in RSN_INDICES]
 
 
 def test_get_rsn_labels_short():
@@ -73,16 +170,6 @@ def test_get_rsn_labels_long():
 
 # --- Correlation Methods ---
 
-@pytest.fixture
-def sample_data_14():
-    return generate_abide_timeseries(n_timepoints=50, n_components=14, seed=42)
-
-
-@pytest.fixture
-def sample_data_100():
-    return generate_abide_timeseries(n_timepoints=100, n_components=14, seed=42)
-
-
 def test_pearson_matrix_shape(sample_data_14):
     matrix = pearson_matrix(sample_data_14)
     assert matrix.shape == (14, 14)
@@ -113,6 +200,17 @@ def test_spearman_matrix_symmetric(sample_data_14):
     np.testing.assert_array_almost_equal(matrix, matrix.T)
 
 
+def test_pearson_matrix_matches_corrcoef(sample_data_14):
+    np.testing.assert_allclose(
+        pearson_matrix(sample_data_14), np.corrcoef(sample_data_14.T), atol=1e-12
+    )
+
+
+def test_spearman_matrix_matches_scipy(sample_data_14):
+    expected = stats.spearmanr(sample_data_14)[0]
+    np.testing.assert_allclose(spearman_matrix(sample_data_14), expected, atol=1e-12)
+
+
 def test_compute_correlation_dispatches_to_pearson(sample_data_14):
     matrix = compute_correlation(sample_data_14, CorrelationMethod.PEARSON)
     expected = pearson_matrix(sample_data_14)
@@ -145,6 +243,51 @@ def test_windowed_correlation_larger_step_produces_fewer_frames(sample_data_100)
     assert matrices_step1.shape[0] > matrices_step5.shape[0]
 
 
+@pytest.mark.parametrize("step", [1, 7, 40])
+@pytest.mark.parametrize("method", [CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN])
+def test_windowed_correlation_matches_per_window_correlation(sample_data_100, method, step):
+    matrices = windowed_correlation(sample_data_100, method, window_size=30, step=step)
+
+    for f, matrix in enumerate(matrices):
+        window = sample_data_100[f * step : f * step + 30]
+        np.testing.assert_allclose(matrix, compute_correlation(window, method), atol=1e-6)
+
+
+def test_windowed_spearman_averages_tied_ranks(sample_data_100):
+    # Coarse rounding leaves many repeated values in every window
+    data = np.round(sample_data_100 / 50)
+    matrices = windowed_correlation(data, CorrelationMethod.SPEARMAN, window_size=30, step=10)
+
+    for f, matrix in enumerate(matrices):
+        expected = np.asarray(stats.spearmanr(data[f * 10 : f * 10 + 30])[0])
+        np.testing.assert_allclose(matrix, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("method", [CorrelationMethod.PEARSON, CorrelationMethod.SPEARMAN])
+def test_windowed_correlation_blocks_match_unblocked(
+    sample_data_100, method, monkeypatch: pytest.MonkeyPatch
+):
+    expected = windowed_correlation(sample_data_100, method, window_size=20, step=20)
+
+    # One window per block
+    monkeypatch.setattr(processing_module, "_FRAME_BLOCK_BYTES", 1)
+    blocked = windowed_correlation(sample_data_100, method, window_size=20, step=20)
+
+    np.testing.assert_allclose(blocked, expected)
+
+
+def test_windowed_pearson_is_nan_for_series_constant_in_window(sample_data_100):
+    data = sample_data_100.copy()
+    data[:40, 3] = 7.0
+
+    matrices = windowed_correlation(data, CorrelationMethod.PEARSON, window_size=30, step=5)
+
+    # Windows starting at 0, 5 and 10 lie inside the constant stretch
+    assert np.isnan(matrices[:3, 3]).all()
+    assert np.isnan(matrices[:3, :, 3]).all()
+    assert not np.isnan(matrices[3:]).any()
+
+
 def test_windowed_correlation_raises_when_window_exceeds_data(sample_data_100):
     with pytest.raises(ValueError, match="too large"):
         windowed_correlation(
@@ -154,27 +297,35 @@ def test_windowed_correlation_raises_when_window_exceeds_data(sample_data_100):
 
 # --- Main API Function ---
 
-def test_compute_correlation_matrices_returns_list(single_abide_file: Path):
+@pytest.fixture(scope="module")
+def single_abide_matrices(single_abide_file: Path) -> list[np.ndarray]:
     params = CorrelationParams(
         method=CorrelationMethod.PEARSON,
         window_size=30,
         step=5,
     )
-    matrices = compute_correlation_matrices(single_abide_file, params)
+    return compute_correlation_matrices(single_abide_file, params)
+
+
+def test_compute_correlation_matrices_returns_list(single_abide_matrices: list[np.ndarray]):
+    matrices = single_abide_matrices
 
     assert isinstance(matrices, list)
     assert len(matrices) > 0
     assert matrices[0].shape == (14, 14)
 
 
-def test_compute_correlation_matrices_values_in_range(single_abide_file: Path):
-    params = CorrelationParams(
-        method=CorrelationMethod.PEARSON,
-        window_size=30,
-        step=5,
+def test_compute_correlation_matrices_matches_parsed_file(
+    single_abide_matrices: list[np.ndarray], single_abide_parsed: np.ndarray
+):
+    expected = windowed_correlation(
+        filter_rsn_columns(single_abide_parsed), CorrelationMethod.PEARSON, 30, 5
     )
-    matrices = compute_correlation_matrices(single_abide_file, params)
-    arr = np.array(matrices)
+    np.testing.assert_array_equal(np.array(single_abide_matrices), expected)
+
+
+def test_compute_correlation_matrices_values_in_range(single_abide_matrices: list[np.ndarray]):
+    arr = np.array(single_abide_matrices)
 
     assert -1.0 <= arr.min() <= arr.max() <= 1.0
 
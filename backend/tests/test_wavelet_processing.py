@@ -0,0 +1,105 @@
+from pathlib import Path
+from typing import Generator
+
+import h5py
+import numpy as np
+import pytest
+
+import app.wavelet_processing as wavelet_module
+from app.rsn_constants import NUM_RSNS, RSN_NAME_TO_POSITION, CorrelationParams
+from app.wavelet_processing import PHASE_LEAD, compute_wavelet_matrices
+
+SUBJECTS = [50001, 50002]
+N_TIMEPOINTS = 40
+# Periods 12, 20 and 50 fall inside the 10-100 band, 5 and 120 don't
+PERIODS = [5.0, 12.0, 20.0, 50.0, 120.0]
+# One chunked pair (read_direct path) and one contiguous pair (memmap path)
+CHUNKED_PAIR = ("aDMN", "V1")
+CONTIGUOUS_PAIR = ("V1", "aDMN")
+
+_CACHED = (
+    wavelet_module._open_wavelet_file,
+    wavelet_module._subject_index,
+    wavelet_module._period_per_subject,
+    wavelet_module._pair_datasets,
+)
+
+
+@pytest.fixture(scope="module")
+def angle_maps() -> dict[tuple[str, str], np.ndarray]:
+    rng = np.random.default_rng(0)
+    shape = (len(SUBJECTS), N_TIMEPOINTS, len(PERIODS))
+    return {
+        pair: rng.integers(-2, 3, size=shape, dtype=np.int8)
+        for pair in (CHUNKED_PAIR, CONTIGUOUS_PAIR)
+    }
+
+
+@pytest.fixture
+def wavelet_file(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    angle_maps: dict[tuple[str, str], np.ndarray],
+) -> Generator[Path, None, None]:
+    h5_path = tmp_path / "wavelet.h5"
+    with h5py.File(str(h5_path), "w") as f:
+        f["wavelet_subjects"] = np.array(SUBJECTS)
+        f["period_per_subject"] = np.tile(np.array(PERIODS)[:, np.newaxis], len(SUBJECTS))
+        f.create_dataset(
+            "pairs/aDMN_V1/angle_maps",
+            data=angle_maps[CHUNKED_PAIR],
+            chunks=(1, N_TIMEPOINTS, len(PERIODS)),
+        )
+        f.create_dataset("pairs/V1_aDMN/angle_maps", data=angle_maps[CONTIGUOUS_PAIR])
+
+    monkeypatch.setattr(wavelet_module, "WAVELET_HDF5_PATH", h5_path)
+    for cached in _CACHED:
+        cached.cache_clear()
+    yield h5_path
+
+    wavelet_module._open_wavelet_file(h5_path).close()
+    for cached in _CACHED:
+        cached.cache_clear()
+
+
+def test_pair_datasets_cover_both_read_paths(wavelet_file: Path):
+    sources = {
+        (i, j): angle_maps for i, j, angle_maps in wavelet_module._pair_datasets(wavelet_file)
+    }
+
+    assert isinstance(sources[(0, 1)], h5py.Dataset)
+    assert isinstance(sources[(1, 0)], np.memmap)
+
+
+@pytest.mark.parametrize(
+    "window_size, step",
+    [(None, None), (10, 1), (7, 3), (5, 8)],
+)
+def test_wavelet_matrices_match_per_window_count(
+    wavelet_file: Path,
+    angle_maps: dict[tuple[str, str], np.ndarray],
+    window_size: int | None,
+    step: int | None,
+):
+    params = CorrelationParams(window_size=window_size, step=step)
+    matrices = compute_wavelet_matrices(Path("dr_stage1_subject0050002.txt"), params)
+
+    scales = [1, 2, 3]
+    window = window_size if window_size is not None else N_TIMEPOINTS
+    stride = step if step is not None else 1
+    n_frames = (N_TIMEPOINTS - window) // stride + 1
+    assert len(matrices) == n_frames
+
+    for frame_idx, matrix in enumerate(matrices):
+        expected = np.zeros((NUM_RSNS, NUM_RSNS))
+        start = frame_idx * stride
+        for (rsn1, rsn2), data in angle_maps.items():
+            frame = data[1, start : start + window][:, scales]
+            i, j = RSN_NAME_TO_POSITION[rsn1], RSN_NAME_TO_POSITION[rsn2]
+            expected[i, j] = np.count_nonzero(frame == PHASE_LEAD) / frame.size
+        np.testing.assert_allclose(matrix, expected, rtol=1e-6)
+
+
+def test_wavelet_matrices_raise_for_unknown_subject(wavelet_file: Path):
+    with pytest.raises(ValueError, match="not found"):
+        compute_wavelet_matrices(Path("dr_stage1_subject0099999.txt"), CorrelationParams())
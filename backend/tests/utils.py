@@ -1,37 +1,45 @@
 import numpy as np
 
+# Correlated component pairs injected into the synthetic data, with the
+# strength of their shared signal: DMN-like, visual-like and FPN-like
+CORRELATED_PAIRS = (((0, 1), 0.6), ((2, 3), 0.5), ((5, 6), 0.4))
+
 
 def generate_abide_timeseries(
     n_timepoints: int = 100,
     n_components: int = 32,
     seed: int = 42,
+    rng: np.random.Generator | None = None,
 ) -> np.ndarray:
-    """Generate synthetic ABIDE data with some correlated component pairs."""
-    rng = np.random.default_rng(seed)
-
-    # Base random data
-    data = rng.standard_normal((n_timepoints, n_components))
-
-    # Add correlations between component pairs (only if indices exist)
-    # Pair 1: DMN-like correlation between first two components
-    if n_components >= 2:
-        signal = rng.standard_normal(n_timepoints)
-        data[:, 0] += 0.6 * signal
-        data[:, 1] += 0.6 * signal
-
-    # Pair 2: Visual-like correlation between components 2-4
-    if n_components >= 4:
-        signal = rng.standard_normal(n_timepoints)
-        data[:, 2] += 0.5 * signal
-        data[:, 3] += 0.5 * signal
-
-    # Pair 3: FPN-like correlation between components 5-6
-    if n_components >= 7:
-        signal = rng.standard_normal(n_timepoints)
-        data[:, 5] += 0.4 * signal
-        data[:, 6] += 0.4 * signal
+    """Generate synthetic ABIDE data with some correlated component pairs.
+
+    Pass `rng` to draw several subjects from one generator (`seed` is then
+    ignored) instead of constructing a new one per subject.
+    """
+    if rng is None:
+        rng = np.random.default_rng(seed)
+
+    # Base random data and one shared signal per correlated pair, in one draw
+    draws = rng.standard_normal((n_timepoints, n_components + len(CORRELATED_PAIRS)))
+    data = draws[:, :n_components].copy()
+    signals = draws[:, n_components:]
+
+    # Add correlations between component pairs (only if indices exist);
+    # both columns of a pair get the signal in one broadcast, in place
+    for k, (columns, strength) in enumerate(CORRELATED_PAIRS):
+        if n_components > max(columns):
+            data[:, columns] += strength * signals[:, k : k + 1]
 
     # Scale to realistic BOLD-like values
-    data = data * 50 + 100
+    data *= 50
+    data += 100
 
     return data
+
+
+def format_dr_file(data: np.ndarray) -> str:
+    """Same layout as np.savetxt, formatted with one % call instead of one per row."""
+    n_rows, n_cols = data.shape
+    row_fmt = " ".join(["%.6f"] * n_cols)
+    text = "\n".join([row_fmt] * n_rows) + "\n"
+    return text % tuple(data.ravel().tolist())
@@ -20,6 +20,8 @@ export type SubjectEntry = {
 
 export type OverviewAsset = {
 	version: number;
+	// Version 2+: each `w` holds integer weights multiplied by this scale
+	weight_scale?: number;
 	rsn_labels: string[];
 	rsn_full_names: string[];
 	methods: Record<string, MethodInfo>;
@@ -31,6 +33,7 @@ export function buildGraphFrame(
 	symmetric: boolean,
 	rsnLabels: string[],
 	rsnFullNames: string[],
+	weightScale = 1,
 ): GraphFrame {
 	const n = rsnLabels.length;
 	const degreeMap: Record<string, number> = {};
@@ -46,7 +49,7 @@ export function buildGraphFrame(
 			edges.push({
 				source: rsnLabels[i],
 				target: rsnLabels[j],
-				weight: weights[idx],
+				weight: weights[idx] / weightScale,
 			});
 			degreeMap[rsnLabels[i]]++;
 			if (symmetric) degreeMap[rsnLabels[j]]++;
@@ -74,6 +74,7 @@ function buildForMethod(
 			methodInfo.symmetric,
 			asset.rsn_labels,
 			asset.rsn_full_names,
+			asset.weight_scale ?? 1,
 		);
 
 		return {